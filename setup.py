@@ -86,5 +86,6 @@ setup(
         # eg:
         #   "rst": ["docutils>=0.11"],
         #   ":python_version=="2.6"": ["argparse"],
+        "parquet": ["pyarrow>=0.15"],
     },
 )
@@ -82,3 +82,16 @@ def supervised(args: Tuple[str]):
         "PYTHONPATH=. luigi --module mars_gym.evaluation.task EvaluateTestSetPredictions "
         f"--model-task-class mars_gym.simulation.training.SupervisedModelTraining {args_str} --local-scheduler"
     )
+
+
+@cli.command(name="convert-predictions")
+@click.argument("task_dir")
+def convert_predictions(task_dir: str):
+    """Converts the test_set_predictions.csv of TASK_DIR to the npy format."""
+    from mars_gym.evaluation.predictions import convert_csv_test_set_predictions
+    from mars_gym.utils.files import get_test_set_predictions_path
+
+    convert_csv_test_set_predictions(
+        get_test_set_predictions_path(task_dir),
+        get_test_set_predictions_path(task_dir, "npy"),
+    )
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import pickle
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+import pandas as pd
+
+from mars_gym.meta_config import ProjectConfig
+
+T = TypeVar("T")
+
+
+def file_signature(path: str) -> Tuple[str, int, int]:
+    # A prepared split is rewritten only when its task runs again, which changes
+    # its modification time
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def project_config_signature(project_config: ProjectConfig) -> tuple:
+    return (
+        tuple(
+            (column.name, column.type.name, column.same_index_as)
+            for column in project_config.all_columns
+        ),
+        project_config.available_arms_column_name,
+    )
+
+
+def hash_key(*parts: Any) -> str:
+    return hashlib.sha1(pickle.dumps(parts, protocol=4)).hexdigest()
+
+
+def evict_cached(directory: str, max_size: int, keep: Optional[str] = None) -> None:
+    # Removes the least recently used files until the directory fits max_size bytes,
+    # except keep
+    paths = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if not name.endswith(".tmp")
+    ]
+    stats = []
+    for path in paths:
+        try:
+            stats.append((os.stat(path), path))
+        except FileNotFoundError:  # Removed by another task
+            pass
+    size = sum(stat.st_size for stat, _ in stats)
+    for stat, path in sorted(stats, key=lambda stat_path: stat_path[0].st_mtime):
+        if size <= max_size:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size -= stat.st_size
+
+
+def read_cached(
+    path: str, create: Callable[[], T], max_size: Optional[int] = None
+) -> T:
+    # Anything picklable, usually data frames. With max_size, the least recently
+    # used files of the directory are removed once it holds more than that
+    if os.path.exists(path):
+        print("Reading the cached {}...".format(path))
+        value = pd.read_pickle(path)
+        os.utime(path)  # Marks it as recently used
+        return value
+
+    value = create()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Renamed only once complete, so concurrent tasks never read a partial file
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    pd.to_pickle(value, tmp_path)
+    os.replace(tmp_path, path)
+    if max_size is not None:
+        evict_cached(os.path.dirname(path), max_size, keep=path)
+    return value
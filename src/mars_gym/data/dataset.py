@@ -1,13 +1,15 @@
-from typing import Tuple, List, Union, Optional, Dict, Any
+from typing import Tuple, List, Union, Optional, Dict, Any, Callable
 
 import functools
+import itertools
 import numpy as np
 import pandas as pd
-import random
 from torch.utils.data import Dataset
 
+from mars_gym.data.storage import ArrayColumns, MemoryMappedColumn, MemoryMappedColumns
 from mars_gym.meta_config import ProjectConfig, IOType, Column
 from mars_gym.utils.index_mapping import map_array
+from mars_gym.utils.sampling import AliasTable
 from mars_gym.utils.utils import parallel_literal_eval, reduce_df_mem
 import gc
 def literal_eval_array_columns(data_frame: pd.DataFrame, columns: List[Column]):
@@ -88,24 +90,75 @@ def preprocess_metadata_data_frame(
     return embeddings_for_metadata
 
 
-def _rand_int_except(low: int, high: int, exception: int) -> int:
-    while True:
-        number = np.random.randint(low, high)
-        if number != exception:
-            return number
+def _to_padded_array(values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    # Rows of different lengths are padded with 0 at the end
+    if len(values) == 0 or np.ndim(values[0]) != 1:
+        return np.array([np.array(v, dtype=dtype) for v in values])
 
-
-def _choose_except(values: list, exception: Any) -> int:
-    while True:
-        value = random.choice(values)
-        if value != exception:
-            return value
+    lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+    padded = np.zeros((len(values), lengths.max()), dtype=dtype)
+    padded[np.arange(padded.shape[1]) < lengths[:, None]] = np.fromiter(
+        itertools.chain.from_iterable(values), dtype=dtype, count=lengths.sum()
+    )
+    return padded
+
+
+def _rand_ints_except(low: int, high: int, exceptions: np.ndarray) -> np.ndarray:
+    # Rejection sampling over the whole batch: only the draws equal to their
+    # exception are drawn again
+    numbers = np.random.randint(low, high, size=len(exceptions))
+    rejected = np.flatnonzero(numbers == exceptions) if high - low > 1 else []
+    while len(rejected) > 0:
+        numbers[rejected] = np.random.randint(low, high, size=len(rejected))
+        rejected = rejected[numbers[rejected] == exceptions[rejected]]
+    return numbers
+
+
+def _alias_choice_except(
+    items: np.ndarray,
+    alias_table: AliasTable,
+    exceptions: np.ndarray,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    # Same rejection sampling as _rand_ints_except, over the alias table items
+    chosen = items[alias_table.sample(rng, len(exceptions))]
+    rejected = np.flatnonzero(chosen == exceptions) if len(items) > 1 else []
+    while len(rejected) > 0:
+        chosen[rejected] = items[alias_table.sample(rng, len(rejected))]
+        rejected = rejected[chosen[rejected] == exceptions[rejected]]
+    return chosen
+
+
+def _choose_except(
+    offsets: np.ndarray, values: np.ndarray, rows: np.ndarray, exceptions: np.ndarray
+) -> np.ndarray:
+    # Draws one of values[offsets[row]:offsets[row + 1]] for every row, different
+    # from its exception whenever the row has another value
+    starts = np.asarray(offsets[rows])
+    lengths = np.asarray(offsets[rows + 1]) - starts
+    chosen = exceptions.copy()
+
+    pending = np.flatnonzero(lengths > 0)
+    while len(pending) > 0:
+        chosen[pending] = values[
+            starts[pending]
+            + (np.random.random(len(pending)) * lengths[pending]).astype(np.int64)
+        ]
+        pending = np.array(
+            [
+                i
+                for i in pending[chosen[pending] == exceptions[pending]]
+                if (values[starts[i] : starts[i] + lengths[i]] != exceptions[i]).any()
+            ],
+            dtype=np.int64,
+        )
+    return chosen
 
 
 class InteractionsDataset(Dataset):
     def __init__(
         self,
-        data_frame: pd.DataFrame,
+        data_frame: Union[pd.DataFrame, MemoryMappedColumns, ArrayColumns],
         embeddings_for_metadata: Optional[Dict[Any, np.ndarray]],
         project_config: ProjectConfig,
         index_mapping: Dict[str, Dict[Any, int]],
@@ -115,28 +168,45 @@ class InteractionsDataset(Dataset):
         self._project_config = project_config
         self._index_mapping  = index_mapping
         self._input_columns: List[Column] = project_config.input_columns
-        input_column_names = [input_column.name for input_column in self._input_columns]
 
         if project_config.item_is_input:
             self._item_input_index = self._input_columns.index(
                 project_config.item_column
             )
 
-        auxiliar_output_column_names = [
-            auxiliar_output_column.name
-            for auxiliar_output_column in project_config.auxiliar_output_columns
-        ]
-        self._data_frame = data_frame[
-            set(
-                input_column_names
-                + [project_config.output_column.name]
-                + auxiliar_output_column_names
-            ).intersection(data_frame.columns)
+        # Every column is converted once, so a batch is just a gather of its rows
+        self._length = len(data_frame)
+        self._inputs: Tuple[np.ndarray, ...] = tuple(
+            self._load_column(data_frame, column)
+            for column in self._input_columns
+            if column.name in data_frame.columns
+        )
+        self._metadata_columns: List[Column] = [
+            column
+            for column in project_config.metadata_columns
+            if column.name not in data_frame.columns
         ]
+        self._output = self._load_column(data_frame, project_config.output_column)
+        self._auxiliar_outputs: Tuple[np.ndarray, ...] = tuple(
+            self._load_column(data_frame, column)
+            for column in project_config.auxiliar_output_columns
+        )
         self._embeddings_for_metadata = embeddings_for_metadata
 
     def __len__(self) -> int:
-        return self._data_frame.shape[0]
+        return self._length
+
+    def _load_column(
+        self,
+        data_frame: Union[pd.DataFrame, MemoryMappedColumns, ArrayColumns],
+        column: Column,
+    ) -> Union[np.ndarray, MemoryMappedColumn]:
+        if isinstance(data_frame, MemoryMappedColumns):
+            # Already converted on disk, the rows are read batch by batch
+            return data_frame[column.name]
+        if isinstance(data_frame, ArrayColumns):
+            return self._convert_dtype(data_frame[column.name], column.type)
+        return self._convert_dtype(data_frame[column.name].values, column.type)
 
     def _convert_dtype(self, value: np.ndarray, type: IOType) -> np.ndarray:
         if type == IOType.INDEXABLE:
@@ -144,9 +214,9 @@ class InteractionsDataset(Dataset):
         if type == IOType.NUMBER:
             return value.astype(np.float64)
         if type in (IOType.INT_ARRAY, IOType.INDEXABLE_ARRAY):
-            return np.array([np.array(v, dtype=np.int64) for v in value])
+            return _to_padded_array(value, np.int64)
         if type == IOType.FLOAT_ARRAY:
-            return np.array([np.array(v, dtype=np.float64) for v in value])
+            return _to_padded_array(value, np.float64)
         return value
 
     def __getitem__(
@@ -154,13 +224,9 @@ class InteractionsDataset(Dataset):
     ) -> Tuple[Tuple[np.ndarray, ...], Union[np.ndarray, Tuple[np.ndarray, ...]]]:
         if isinstance(indices, int):
             indices = [indices]
-        rows: pd.Series = self._data_frame.iloc[indices]
 
-        inputs = tuple(
-            self._convert_dtype(rows[column.name].values, column.type)
-            for column in self._input_columns if column.name in self._data_frame.columns
-        )
-        
+        inputs = tuple(values[indices] for values in self._inputs)
+
         if (
             self._project_config.item_is_input
             and self._embeddings_for_metadata is not None
@@ -168,27 +234,35 @@ class InteractionsDataset(Dataset):
             item_indices = inputs[self._item_input_index]
             inputs += tuple(
                 self._embeddings_for_metadata[column.name][item_indices]
-                for column in self._project_config.metadata_columns if column.name not in self._data_frame.columns
+                for column in self._metadata_columns
             )
-        #from IPython import embed; embed()
-        #
-        output = self._convert_dtype(
-            rows[self._project_config.output_column.name].values,
-            self._project_config.output_column.type,
-        )
-        if self._project_config.auxiliar_output_columns:
+
+        output = self._output[indices]
+        if self._auxiliar_outputs:
             output = tuple([output]) + tuple(
-                self._convert_dtype(rows[column.name].values, column.type)
-                for column in self._project_config.auxiliar_output_columns
+                values[indices] for values in self._auxiliar_outputs
             )
-        # print(inputs)
         return inputs, output
 
+    def _replace_items(
+        self, inputs: Tuple[np.ndarray, ...], items: np.ndarray
+    ) -> Tuple[np.ndarray, ...]:
+        # Replaces the item of every row, along with its metadata embeddings, which
+        # come after the input columns. A negative row sampled from a positive one
+        # must not keep the metadata of the positive item, which gives the label away
+        inputs = list(inputs)
+        inputs[self._item_input_index] = items
+        if self._embeddings_for_metadata is not None:
+            n_columns = len(self._inputs)
+            for i, column in enumerate(self._metadata_columns):
+                inputs[n_columns + i] = self._embeddings_for_metadata[column.name][items]
+        return tuple(inputs)
+
 
 class InteractionsWithNegativeItemGenerationDataset(InteractionsDataset):
     def __init__(
         self,
-        data_frame: pd.DataFrame,
+        data_frame: Union[pd.DataFrame, MemoryMappedColumns],
         embeddings_for_metadata: Optional[Dict[str, np.ndarray]],
         project_config: ProjectConfig,
         index_mapping: Dict[str, Dict[Any, int]],
@@ -220,34 +294,29 @@ class InteractionsWithNegativeItemGenerationDataset(InteractionsDataset):
         if isinstance(indices, int):
             indices = [indices]
         if isinstance(indices, slice):
-            indices = list(range(len(self))[indices])
+            indices = np.arange(len(self))[indices]
+        indices = np.asarray(indices, dtype=np.int64)
 
         n = super().__len__()
 
-        positive_indices = [index for index in indices if index < n]
+        positive_indices = indices[indices < n]
         num_of_negatives = len(indices) - len(positive_indices)
         positive_input, positive_output = super().__getitem__(positive_indices)
 
         if num_of_negatives > 0:
-            sample_positive_indices = list(
-                np.random.randint(0, n, size=num_of_negatives)
-            )
+            sample_positive_indices = np.random.randint(0, n, size=num_of_negatives)
 
             negative_input, _ = super().__getitem__(sample_positive_indices)
             negative_output = self._convert_dtype(
                 np.zeros(num_of_negatives), self._project_config.output_column.type
             )
 
-            negative_input = list(negative_input)
-            negative_input[self._item_input_index] = np.array(
-                [
-                    _rand_int_except(0, self._max_item_idx + 1, exception=item_idx)
-                    for item_idx in negative_input[self._item_input_index]
-                ]
+            negative_input = self._replace_items(
+                negative_input,
+                self._draw_negative_items(negative_input[self._item_input_index]),
             )
-            negative_input = tuple(negative_input)
 
-            if positive_indices:
+            if len(positive_indices) > 0:
                 input_ = tuple(
                     np.concatenate([positive_array, negative_array])
                     for positive_array, negative_array in zip(
@@ -264,13 +333,128 @@ class InteractionsWithNegativeItemGenerationDataset(InteractionsDataset):
 
         return input_, output
 
+    def _draw_negative_items(self, exceptions: np.ndarray) -> np.ndarray:
+        return _rand_ints_except(0, self._max_item_idx + 1, exceptions=exceptions)
+
+
+class InteractionsWithWeightedNegativeItemGenerationDataset(
+    InteractionsWithNegativeItemGenerationDataset
+):
+    """Draws the negative items in proportion to count^popularity_alpha.
+
+    A ``hard_negative_proportion`` of them is drawn instead among the
+    ``hard_negatives_top_k`` items the model scores the highest, once
+    ``refresh_hard_negatives`` is called (by the training, before the first epoch
+    and then every ``hard_negatives_refresh_interval`` epochs). The top-k is global: it ranks the
+    mean score of each item over ``hard_negatives_n_contexts`` random contexts, and
+    only the true item of each row is excluded, since per-user top-k tables would
+    have to be rebuilt for every user. Both distributions are alias tables, so
+    every draw is O(1).
+    """
+
+    def __init__(
+        self,
+        data_frame: Union[pd.DataFrame, MemoryMappedColumns],
+        embeddings_for_metadata: Optional[Dict[str, np.ndarray]],
+        project_config: ProjectConfig,
+        index_mapping: Dict[str, Dict[Any, int]],
+        negative_proportion: float = 0.8,
+        popularity_alpha: float = 0.75,
+        hard_negative_proportion: float = 0.0,
+        hard_negatives_top_k: int = 100,
+        hard_negatives_n_contexts: int = 16,
+        hard_negatives_refresh_interval: int = 1,
+        *args,
+        **kwargs
+    ) -> None:
+        super().__init__(
+            data_frame,
+            embeddings_for_metadata,
+            project_config,
+            index_mapping,
+            negative_proportion,
+            *args,
+            **kwargs
+        )
+        self._hard_negative_proportion = hard_negative_proportion
+        self._hard_negatives_top_k = hard_negatives_top_k
+        self._hard_negatives_n_contexts = hard_negatives_n_contexts
+        self._hard_negatives_refresh_interval = hard_negatives_refresh_interval
+
+        items = self._inputs[self._item_input_index]
+        if isinstance(items, MemoryMappedColumn):
+            items = items.values
+        counts = np.bincount(items, minlength=self._max_item_idx + 1)
+        # Items never seen in the training data are never drawn
+        self._popular_items = np.flatnonzero(counts)
+        self._popularity_table = AliasTable(
+            counts[self._popular_items].astype(np.float64) ** popularity_alpha
+        )
+
+        self._hard_negative_items: Optional[np.ndarray] = None
+        self._hard_negatives_table: Optional[AliasTable] = None
+
+    @property
+    def hard_negatives_refresh_interval(self) -> Optional[int]:
+        # None when no hard negatives are drawn
+        if self._hard_negative_proportion > 0:
+            return self._hard_negatives_refresh_interval
+        return None
+
+    def refresh_hard_negatives(
+        self,
+        scorer: Callable[[Tuple[np.ndarray, ...]], np.ndarray],
+        batch_size: int = 500,
+    ) -> None:
+        """``scorer`` returns the model scores of a batch of inputs of this dataset.
+
+        Meant to be called in the main process, before the DataLoader workers
+        copy the dataset.
+        """
+        n = InteractionsDataset.__len__(self)
+        scores = np.zeros(len(self._popular_items), dtype=np.float64)
+        for row in np.random.randint(0, n, size=self._hard_negatives_n_contexts):
+            for start in range(0, len(self._popular_items), batch_size):
+                items = self._popular_items[start : start + batch_size]
+                inputs, _ = InteractionsDataset.__getitem__(
+                    self, np.full(len(items), row)
+                )
+                inputs = self._replace_items(inputs, items)
+                scores[start : start + batch_size] += np.asarray(
+                    scorer(inputs), dtype=np.float64
+                ).reshape(-1)
+        scores /= self._hard_negatives_n_contexts
+
+        top = np.argsort(-scores, kind="stable")[: self._hard_negatives_top_k]
+        self._hard_negative_items = self._popular_items[top]
+        self._hard_negatives_table = AliasTable(np.exp(scores[top] - scores[top].max()))
+
+    def _draw_negative_items(self, exceptions: np.ndarray) -> np.ndarray:
+        # Follows the global numpy seed, as the other datasets do
+        rng = np.random.default_rng(np.random.randint(2 ** 32, dtype=np.uint64))
+        chosen = _alias_choice_except(
+            self._popular_items, self._popularity_table, exceptions, rng
+        )
+
+        if self._hard_negatives_table is not None and self._hard_negative_proportion > 0:
+            hard = np.flatnonzero(
+                rng.random(len(exceptions)) < self._hard_negative_proportion
+            )
+            chosen[hard] = _alias_choice_except(
+                self._hard_negative_items,
+                self._hard_negatives_table,
+                exceptions[hard],
+                rng,
+            )
+        return chosen
+
 
 class InteractionsWithNegativeItemGenerationByAvailableItemsDataset(
     InteractionsDataset
 ):
     def __init__(
         self,
-        data_frame: pd.DataFrame,
+        data_frame: Union[pd.DataFrame, MemoryMappedColumns],
         embeddings_for_metadata: Optional[Dict[str, np.ndarray]],
         project_config: ProjectConfig,
         index_mapping: Dict[str, Dict[Any, int]],
@@ -281,8 +465,23 @@ class InteractionsWithNegativeItemGenerationByAvailableItemsDataset(
         # data_frame = data_frame[data_frame[project_config.output_column.name] > 0]
 
         assert project_config.available_arms_column_name in data_frame
-        self._available_items = data_frame[project_config.available_arms_column_name].map(
-            functools.partial(map_array, mapping=index_mapping[project_config.item_column.name])).values
+        # CSR storage: the available items of the i-th row are
+        # values[offsets[i]:offsets[i + 1]]
+        if isinstance(data_frame, MemoryMappedColumns):
+            # Written already mapped to the item indices
+            available_items = data_frame[project_config.available_arms_column_name]
+            self._available_items_offsets = available_items.offsets
+            self._available_items_values = available_items.values
+        else:
+            available_items = data_frame[project_config.available_arms_column_name].map(
+                functools.partial(map_array, mapping=index_mapping[project_config.item_column.name])).values
+            self._available_items_offsets = np.zeros(len(available_items) + 1, dtype=np.int64)
+            np.cumsum([len(items) for items in available_items], out=self._available_items_offsets[1:])
+            self._available_items_values = np.fromiter(
+                itertools.chain.from_iterable(available_items),
+                dtype=np.int64,
+                count=self._available_items_offsets[-1],
+            )
 
         super().__init__(
             data_frame,
@@ -305,32 +504,34 @@ class InteractionsWithNegativeItemGenerationByAvailableItemsDataset(
         if isinstance(indices, int):
             indices = [indices]
         if isinstance(indices, slice):
-            indices = list(range(len(self))[indices])
+            indices = np.arange(len(self))[indices]
+        indices = np.asarray(indices, dtype=np.int64)
 
         n = super().__len__()
 
-        positive_indices = [index for index in indices if index < n]
-        negative_indices = [index - (index // n) * n for index in indices if index >= n]
+        positive_indices = indices[indices < n]
+        negative_indices = indices[indices >= n] % n
 
         positive_input, positive_output = super().__getitem__(positive_indices)
 
-        if negative_indices:
+        if len(negative_indices) > 0:
             negative_input, _ = super().__getitem__(negative_indices)
 
             negative_output = self._convert_dtype(
                 np.zeros(len(negative_indices)), self._project_config.output_column.type
             )
 
-            negative_input = list(negative_input)
-            negative_input[self._item_input_index] = np.array(
-                [
-                    _choose_except(self._available_items[index], item_idx)
-                    for index, item_idx in zip(negative_indices, negative_input[self._item_input_index])
-                ]
+            negative_input = self._replace_items(
+                negative_input,
+                _choose_except(
+                    self._available_items_offsets,
+                    self._available_items_values,
+                    negative_indices,
+                    negative_input[self._item_input_index],
+                ),
             )
-            negative_input = tuple(negative_input)
 
-            if positive_indices:
+            if len(positive_indices) > 0:
                 input_ = tuple(
                     np.concatenate([positive_array, negative_array])
                     for positive_array, negative_array in zip(
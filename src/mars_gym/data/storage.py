@@ -0,0 +1,220 @@
+import json
+import os
+import shutil
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.meta_config import IOType
+
+DATASET_BACKENDS = ["memory", "mmap"]
+METADATA_FILE = "columns.json"
+
+_SCALAR_DTYPES = {IOType.INDEXABLE: np.int64, IOType.NUMBER: np.float64}
+_ARRAY_DTYPES = {
+    IOType.INDEXABLE_ARRAY: np.int64,
+    IOType.INT_ARRAY: np.int64,
+    IOType.FLOAT_ARRAY: np.float64,
+}
+
+
+def _take_sorted(values: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    # Reads the positions in file order, so the pages are visited sequentially
+    order = np.argsort(positions, kind="stable")
+    taken = np.empty(len(positions), dtype=values.dtype)
+    taken[order] = values[positions[order]]
+    return taken
+
+
+class MemoryMappedColumn(object):
+    """One column of ``MemoryMappedColumns``, gathered from disk on indexing.
+
+    A list of indices (or a slice) returns the converted rows, as in
+    ``InteractionsDataset``: array columns are padded with 0 up to the widest row
+    of the whole column. A single index returns that row unpadded.
+    """
+
+    def __init__(self, path: str, name: str, info: dict) -> None:
+        self._path = path
+        self._name = name
+        self._dtype = np.dtype(info["dtype"])
+        self._ragged = info["ragged"]
+        self._width = info["width"]
+        self._n_rows = info["n_rows"]
+
+    def __getstate__(self):
+        # The memory maps are opened again after unpickling (e.g. in a worker)
+        state = self.__dict__.copy()
+        state.pop("_values", None)
+        state.pop("_offsets", None)
+        return state
+
+    @property
+    def values(self) -> np.ndarray:
+        if not hasattr(self, "_values"):
+            values_path = os.path.join(self._path, "{}.values.bin".format(self._name))
+            # An empty file can't be memory-mapped
+            self._values = (
+                np.memmap(values_path, dtype=self._dtype, mode="r")
+                if os.path.getsize(values_path) > 0
+                else np.zeros(0, dtype=self._dtype)
+            )
+        return self._values
+
+    @property
+    def offsets(self) -> np.ndarray:
+        if not hasattr(self, "_offsets"):
+            self._offsets = np.memmap(
+                os.path.join(self._path, "{}.offsets.bin".format(self._name)),
+                dtype=np.int64,
+                mode="r",
+            )
+        return self._offsets
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def max(self):
+        return self.values.max()
+
+    def __getitem__(self, indices: Union[int, List[int], slice, np.ndarray]) -> np.ndarray:
+        if isinstance(indices, (int, np.integer)):
+            if not self._ragged:
+                return self.values[indices]
+            return np.asarray(
+                self.values[self.offsets[indices] : self.offsets[indices + 1]]
+            )
+
+        if isinstance(indices, slice):
+            indices = np.arange(self._n_rows)[indices]
+        indices = np.asarray(indices, dtype=np.int64)
+        if not self._ragged:
+            return _take_sorted(self.values, indices)
+
+        starts = _take_sorted(self.offsets, indices)
+        lengths = _take_sorted(self.offsets, indices + 1) - starts
+        positions = np.repeat(starts, lengths) + (
+            np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        )
+        rows = np.zeros((len(indices), self._width), dtype=self._dtype)
+        rows[np.arange(self._width) < lengths[:, None]] = _take_sorted(
+            self.values, positions
+        )
+        return rows
+
+
+class MemoryMappedColumns(object):
+    """Dataset columns written once by ``write_memory_mapped_columns``.
+
+    Only the rows of each batch are read, so the resident memory does not depend
+    on the size of the dataset. Can be given to ``InteractionsDataset`` in place
+    of a DataFrame.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(os.path.join(path, METADATA_FILE), "r") as metadata_file:
+            metadata = json.load(metadata_file)
+        self._n_rows = metadata["n_rows"]
+        self._columns: Dict[str, MemoryMappedColumn] = {
+            name: MemoryMappedColumn(path, name, {**info, "n_rows": self._n_rows})
+            for name, info in metadata["columns"].items()
+        }
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns.keys())
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def __getitem__(self, name: str) -> MemoryMappedColumn:
+        return self._columns[name]
+
+
+class ArrayColumns(object):
+    """Dataset columns already held as arrays, one row per element.
+
+    Can be given to ``InteractionsDataset`` in place of a DataFrame, so that
+    batches built on the fly don't need one.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], n_rows: int) -> None:
+        self._columns = columns
+        self._n_rows = n_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns.keys())
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    def to_data_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self._columns, columns=self.columns)
+
+
+def memory_mapped_columns_exist(path: str) -> bool:
+    # The metadata is written last, so a partial write is never reused
+    return os.path.exists(os.path.join(path, METADATA_FILE))
+
+
+def write_memory_mapped_columns(
+    chunks: Iterable[pd.DataFrame], column_types: Dict[str, IOType], path: str
+) -> MemoryMappedColumns:
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    n_rows = 0
+    columns: Dict[str, dict] = {}
+    for chunk in chunks:
+        for name, type in column_types.items():
+            if name not in chunk.columns or (
+                type not in _SCALAR_DTYPES and type not in _ARRAY_DTYPES
+            ):
+                continue
+            ragged = type in _ARRAY_DTYPES
+            dtype = _ARRAY_DTYPES[type] if ragged else _SCALAR_DTYPES[type]
+            info = columns.setdefault(
+                name, {"dtype": np.dtype(dtype).str, "ragged": ragged, "width": 0}
+            )
+
+            with open(os.path.join(path, "{}.values.bin".format(name)), "ab") as values_file:
+                if ragged:
+                    rows = chunk[name].values
+                    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+                    values_file.write(
+                        np.concatenate(
+                            [np.asarray(row, dtype=dtype) for row in rows]
+                            + [np.zeros(0, dtype=dtype)]
+                        ).tobytes()
+                    )
+                    info["width"] = max(info["width"], int(lengths.max(initial=0)))
+                else:
+                    values_file.write(chunk[name].values.astype(dtype).tobytes())
+
+            if ragged:
+                with open(
+                    os.path.join(path, "{}.offsets.bin".format(name)), "ab"
+                ) as offsets_file:
+                    if "n_values" not in info:
+                        info["n_values"] = 0
+                        offsets_file.write(np.zeros(1, dtype=np.int64).tobytes())
+                    offsets_file.write((info["n_values"] + np.cumsum(lengths)).tobytes())
+                    info["n_values"] += int(lengths.sum())
+        n_rows += len(chunk)
+
+    with open(os.path.join(path, METADATA_FILE), "w") as metadata_file:
+        json.dump({"n_rows": n_rows, "columns": columns}, metadata_file, indent=4)
+
+    return MemoryMappedColumns(path)
@@ -0,0 +1,92 @@
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.utils.utils import parallel_literal_eval
+
+PREDICTIONS_FORMATS = ["csv", "npy"]
+RAGGED_COLUMNS = ["sorted_actions", "prob_actions", "action_scores"]
+RAGGED_DTYPES = {
+    "sorted_actions": np.str_,  # The evaluation compares the actions as strings
+    "prob_actions": np.float64,
+    "action_scores": np.float64,
+}
+
+
+class RaggedArray(object):
+    """Rows of different lengths stored as one flat array of values.
+
+    The i-th row is ``values[offsets[i]:offsets[i + 1]]``, a view of ``values``.
+    """
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray) -> None:
+        assert len(offsets) > 0 and offsets[-1] == len(values)
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_lists(cls, rows: Sequence[Sequence[Any]], dtype=None) -> "RaggedArray":
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=offsets[1:])
+        values = (
+            np.concatenate([np.asarray(row, dtype=dtype) for row in rows])
+            if offsets[-1] > 0
+            else np.array([], dtype=dtype)
+        )
+        return cls(values, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.values[self.offsets[index] : self.offsets[index + 1]]
+
+    def to_series(self, index: Optional[pd.Index] = None) -> pd.Series:
+        rows = np.empty(len(self), dtype=object)
+        rows[:] = [self[i] for i in range(len(self))]
+        return pd.Series(rows, index=index)
+
+    def save(self, path: str, name: str) -> None:
+        np.save(os.path.join(path, "{}.values.npy".format(name)), self.values)
+        np.save(os.path.join(path, "{}.offsets.npy".format(name)), self.offsets)
+
+    @classmethod
+    def load(cls, path: str, name: str, mmap_mode: Optional[str] = "r") -> "RaggedArray":
+        return cls(
+            np.load(os.path.join(path, "{}.values.npy".format(name)), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "{}.offsets.npy".format(name)), mmap_mode=mmap_mode),
+        )
+
+
+def write_test_set_predictions(df: pd.DataFrame, path: str) -> None:
+    # A directory with the scalar columns in a CSV and every list column as ragged
+    # .npy arrays, which are read back without parsing
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    df.drop(columns=RAGGED_COLUMNS).to_csv(os.path.join(path, "data.csv"), index=False)
+    for column in RAGGED_COLUMNS:
+        RaggedArray.from_lists(list(df[column]), dtype=RAGGED_DTYPES[column]).save(
+            path, column
+        )
+
+
+def read_test_set_predictions(
+    path: str, dtype: Optional[Dict[str, Any]] = None, mmap_mode: Optional[str] = "r"
+) -> pd.DataFrame:
+    # The list columns hold views of the memory-mapped arrays
+    df = pd.read_csv(os.path.join(path, "data.csv"), dtype=dtype)
+    for column in RAGGED_COLUMNS:
+        df[column] = RaggedArray.load(path, column, mmap_mode).to_series(df.index)
+    return df
+
+
+def convert_csv_test_set_predictions(csv_path: str, path: str) -> None:
+    df = pd.read_csv(csv_path)
+    for column in RAGGED_COLUMNS:
+        df[column] = parallel_literal_eval(df[column])
+    write_test_set_predictions(df, path)
@@ -1,4 +1,5 @@
 import functools
+import itertools
 import json
 import os
 from multiprocessing.pool import Pool
@@ -18,10 +19,16 @@ from mars_gym.data.dataset import (
     preprocess_interactions_data_frame,
     InteractionsDataset,
 )
+from mars_gym.data.cache import file_signature, hash_key, read_cached
+from mars_gym.evaluation.predictions import read_test_set_predictions
 from mars_gym.evaluation.propensity_score import FillPropensityScoreMixin
 from mars_gym.evaluation.metrics.fairness import calculate_fairness_metrics
 from mars_gym.utils import files
-from mars_gym.utils.files import get_test_set_predictions_path, get_params_path
+from mars_gym.utils.files import (
+    get_data_frame_cache_path,
+    get_test_set_predictions_path,
+    get_params_path,
+)
 from mars_gym.evaluation.metrics.offpolicy import (
     eval_IPS,
     eval_CIPS,
@@ -198,24 +205,46 @@ class EvaluateTestSetPredictions(FillPropensityScoreMixin, BaseEvaluationTask):
     def get_catalog(self, df: pd.DataFrame) -> List[str]:
         indexed_list = self.get_item_index()
 
-        test_list    = list(df["sorted_actions"])
-        test_list.append(indexed_list)
-
-        all_items = sum(test_list, [])
+        # Flattened in one pass (summing the lists copies them over and over)
+        all_items = list(itertools.chain(*df["sorted_actions"], indexed_list))
         unique_items = list(np.unique(all_items))
         return unique_items
 
+    def read_test_set_predictions(self) -> pd.DataFrame:
+        dtype = {self.model_training.project_config.item_column.name: "str"}
+        predictions_path = get_test_set_predictions_path(
+            self.model_training.output().path, "npy"
+        )
+        if os.path.isdir(predictions_path):
+            return read_test_set_predictions(predictions_path, dtype=dtype)
+
+        predictions_path = get_test_set_predictions_path(
+            self.model_training.output().path
+        )
+
+        def read_data_frame() -> pd.DataFrame:
+            df: pd.DataFrame = pd.read_csv(predictions_path, dtype=dtype)
+            df["sorted_actions"] = parallel_literal_eval(df["sorted_actions"])
+            df["prob_actions"]   = parallel_literal_eval(df["prob_actions"])
+            df["action_scores"]  = parallel_literal_eval(df["action_scores"])
+            return df
+
+        if not self.model_training.use_data_frame_cache:
+            return read_data_frame()
+        # Parsing the lists is the slow part, so the parsed frame is cached
+        key = hash_key(
+            "test_set_predictions", file_signature(predictions_path), dtype
+        )
+        return read_cached(
+            get_data_frame_cache_path(key),
+            read_data_frame,
+            self.model_training.data_frame_cache_max_size_in_bytes,
+        )
+
     def run(self):
         os.makedirs(self.output().path)
 
-        df: pd.DataFrame = pd.read_csv(
-            get_test_set_predictions_path(self.model_training.output().path),
-            dtype = {self.model_training.project_config.item_column.name : "str"}
-        )  # .sample(10000)
-
-        df["sorted_actions"] = parallel_literal_eval(df["sorted_actions"])
-        df["prob_actions"]   = parallel_literal_eval(df["prob_actions"])
-        df["action_scores"]  = parallel_literal_eval(df["action_scores"])
+        df: pd.DataFrame = self.read_test_set_predictions()  # .sample(10000)
 
         df["action"] = df["sorted_actions"].apply(
             lambda sorted_actions: str(sorted_actions[0])
@@ -239,7 +268,7 @@ class EvaluateTestSetPredictions(FillPropensityScoreMixin, BaseEvaluationTask):
             )
         
         
-        if self.model_training.metadata_data_frame is not None:
+        if self.model_training.metadata_data_frame_path:
             df = pd.merge(
                 df,
                 pd.read_csv(self.model_training.metadata_data_frame_path, dtype = {self.model_training.project_config.item_column.name : "str"}),
@@ -3,3 +3,7 @@ from gym.envs.registration import register
 register(
     id="recsys-v0", entry_point="mars_gym.gym.envs:RecSysEnv",
 )
+
+register(
+    id="recsys-vec-v0", entry_point="mars_gym.gym.envs:VecRecSysEnv",
+)
@@ -1 +1 @@
-from mars_gym.gym.envs.recsys import RecSysEnv
+from mars_gym.gym.envs.recsys import RecSysEnv, VecRecSysEnv
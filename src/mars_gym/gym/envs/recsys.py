@@ -1,4 +1,5 @@
 import collections
+import itertools
 from typing import Tuple, List, Any, Dict, Optional
 
 import gym
@@ -21,45 +22,55 @@ class RecSysEnv(gym.Env, utils.EzPickle):
         number_of_items: int,
         available_items_column: Optional[str] = None,
         item_metadata: Optional[Dict[str, np.ndarray]] = None,
+        binary_available_items: bool = False,
     ):
         super().__init__()
-        self._dataset = dataset.copy()
         self._item_metadata = item_metadata
         self._item_column = item_column
         self._available_items_column = available_items_column
+        self._binary_available_items = binary_available_items
+        self._n_observations = len(dataset)
 
         self._number_of_items = (
             number_of_items  # number_of_itemsdataset[item_column].max() + 1
         )
 
+        # The target item of each observation, so the reward is a scalar compare
+        self._targets = dataset[item_column].to_numpy()
+
         if available_items_column:
             assert isinstance(
-                self._dataset[available_items_column].values[0], collections.Sequence
+                dataset[available_items_column].values[0], collections.Sequence
             )
-            available_items = np.zeros(
-                (len(self._dataset), self._number_of_items), dtype=np.int8
+            # CSR-like storage: the available items of the i-th observation are
+            # values[offsets[i]:offsets[i + 1]]
+            lengths = dataset[available_items_column].map(len).values
+            self._available_items_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=self._available_items_offsets[1:])
+            self._available_items_values = np.fromiter(
+                itertools.chain.from_iterable(dataset[available_items_column]),
+                dtype=np.int64,
+                count=self._available_items_offsets[-1],
             )
-            non_zero_indices = [
-                (i, available_item)
-                for i, available_items in enumerate(
-                    self._dataset[available_items_column]
-                )
-                for available_item in available_items
-            ]
-            i, j = zip(*non_zero_indices)
-            available_items[i, j] = 1
-            self._dataset[available_items_column] = list(iter(available_items))
 
-        self._obs_dataset: List[dict] = self._dataset.drop(
-            columns=[item_column]
-        ).to_dict("records")
+        # One array per observation column. The observations are built lazily
+        # from them, instead of keeping a dict per row.
+        self._obs_columns: Dict[str, np.ndarray] = {
+            column: self._column_to_array(dataset[column])
+            for column in dataset.columns
+            if column not in (item_column, available_items_column)
+        }
 
         self.action_space = spaces.Discrete(self._number_of_items)
 
         observation_space = {
-            key: self._convert_value_to_space(key, value)
-            for key, value in self._obs_dataset[0].items()
+            key: self._convert_value_to_space(key, self._get_value(values, 0))
+            for key, values in self._obs_columns.items()
         }
+        if available_items_column:
+            observation_space[available_items_column] = spaces.MultiBinary(
+                self._number_of_items
+            )
         if item_metadata is not None:
             observation_space[ITEM_METADATA_KEY] = spaces.Dict(
                 {
@@ -72,29 +83,38 @@ class RecSysEnv(gym.Env, utils.EzPickle):
         self.observation_space = spaces.Dict(observation_space)
         self._current_index = 0
 
+    def _column_to_array(self, column: pd.Series) -> np.ndarray:
+        if column.dtype.kind in "biuf":
+            return column.to_numpy()
+        # Lists, strings, timestamps... are kept as the same objects to_dict would return
+        return column.to_numpy(dtype=object)
+
+    def _get_value(self, values: np.ndarray, index: int) -> Any:
+        if values.dtype == np.object_:
+            return values[index]
+        return values.item(index)  # Native Python scalar, as in to_dict("records")
+
+    def _column_min_max(self, key: str) -> Tuple[Any, Any]:
+        values = self._obs_columns[key]
+        if values.dtype == np.object_:
+            values = np.concatenate([np.asarray(value).ravel() for value in values])
+        return values.min(), values.max()
+
     def _convert_value_to_space(self, key: str, value: Any) -> spaces.Space:
         if isinstance(value, list):
             value = np.array(value)
 
-        if key == self._available_items_column:
-            return spaces.MultiBinary(self._number_of_items)
         if isinstance(value, int):
-            return spaces.Discrete(self._dataset[key].max() + 1)
+            return spaces.Discrete(self._column_min_max(key)[1] + 1)
         elif isinstance(value, float):
-            return spaces.Box(
-                self._dataset[key].min(), self._dataset[key].max(), shape=(1,)
-            )
+            return spaces.Box(*self._column_min_max(key), shape=(1,))
         elif isinstance(value, np.ndarray):
             if issubclass(value.dtype.type, np.integer):
                 return spaces.MultiDiscrete(
-                    [np.max(self._dataset[key].max()) + 1] * len(value)
+                    [self._column_min_max(key)[1] + 1] * len(value)
                 )
             elif issubclass(value.dtype.type, np.floating):
-                return spaces.Box(
-                    self._dataset[key].min(),
-                    self._dataset[key].max(),
-                    shape=value.shape,
-                )
+                return spaces.Box(*self._column_min_max(key), shape=value.shape)
         raise ValueError(
             "Unkown type in the observation space for {}:{}".format(key, value)
         )
@@ -105,31 +125,59 @@ class RecSysEnv(gym.Env, utils.EzPickle):
 
     def _compute_reward(self, action: int) -> float:
 
-        return float(
-            self._dataset.iloc[self._current_index][self._item_column] == action
-        )
+        return float(self._targets[self._current_index] == action)
 
-    def _get_next_ob(self) -> dict:
-        ob = self._obs_dataset[self._current_index].copy()
+    def get_available_items(self, index: int) -> np.ndarray:
+        return self._available_items_values[
+            self._available_items_offsets[index] : self._available_items_offsets[
+                index + 1
+            ]
+        ]
+
+    def to_multi_binary(self, available_items: np.ndarray) -> np.ndarray:
+        # Dense view of the available items, as declared in the observation_space
+        binary = np.zeros(self._number_of_items, dtype=np.int8)
+        binary[available_items] = 1
+        return binary
+
+    def _get_ob(self, index: int) -> dict:
+        ob = {
+            key: self._get_value(values, index)
+            for key, values in self._obs_columns.items()
+        }
+        if self._available_items_column:
+            available_items = self.get_available_items(index)
+            ob[self._available_items_column] = (
+                self.to_multi_binary(available_items)
+                if self._binary_available_items
+                else available_items
+            )
         if self._item_metadata is not None:
             ob[ITEM_METADATA_KEY] = self._item_metadata
         else:
             ob[ITEM_METADATA_KEY] = None
         return ob
 
+    def _get_next_ob(self) -> dict:
+        return self._get_ob(self._current_index)
+
     def step(self, action: int) -> Tuple[dict, float, bool, dict]:
         reward = self._compute_reward(action)
         info = self._compute_stats(action)
 
         self._current_index += 1
 
-        done = (self._current_index + 1) == len(self._dataset)
+        done = (self._current_index + 1) == self._n_observations
         next_ob = self._get_next_ob() if not done else None
 
         return next_ob, reward, done, info
 
-    def reset(self) -> dict:
-        self._current_index = 0
+    @property
+    def current_index(self) -> int:
+        return self._current_index
+
+    def reset(self, start_index: int = 0) -> dict:
+        self._current_index = start_index
         return self._get_next_ob()
 
     def render(self, mode="human"):
@@ -137,3 +185,78 @@ class RecSysEnv(gym.Env, utils.EzPickle):
 
     def close(self):
         pass
+
+
+class VecRecSysEnv(RecSysEnv):
+    """RecSysEnv that serves ``num_envs`` consecutive observations at a time.
+
+    Each of the ``num_envs`` cursors points to a different position of the
+    logged stream. ``step`` receives one action per cursor (or per leading
+    cursor, to consume fewer observations) and every cursor then moves past the
+    observations consumed in that step.
+    """
+
+    def __init__(
+        self,
+        dataset: pd.DataFrame,
+        item_column: str,
+        number_of_items: int,
+        available_items_column: Optional[str] = None,
+        item_metadata: Optional[Dict[str, np.ndarray]] = None,
+        binary_available_items: bool = False,
+        num_envs: int = 1,
+    ):
+        super().__init__(
+            dataset,
+            item_column,
+            number_of_items,
+            available_items_column=available_items_column,
+            item_metadata=item_metadata,
+            binary_available_items=binary_available_items,
+        )
+        self.num_envs = num_envs
+
+    def _cursors(self) -> np.ndarray:
+        # Like RecSysEnv, the episode finishes before serving the last row
+        return np.arange(
+            self._current_index,
+            min(self._current_index + self.num_envs, self._n_observations - 1),
+        )
+
+    def _compute_rewards(self, indices: np.ndarray, actions: np.ndarray) -> np.ndarray:
+        return (self._targets[indices] == actions).astype(np.float64)
+
+    def _get_next_obs(self) -> List[dict]:
+        return [self._get_ob(index) for index in self._cursors()]
+
+    def step(
+        self, actions: List[int]
+    ) -> Tuple[List[dict], np.ndarray, np.ndarray, List[dict]]:
+        next_obs, rewards, dones, infos = self.step_policies([actions])
+        return next_obs, rewards[0], dones, infos
+
+    def step_policies(
+        self, actions_per_policy: List[List[int]]
+    ) -> Tuple[List[dict], np.ndarray, np.ndarray, List[dict]]:
+        # Several policies act on the same observations: each one gets its own
+        # rewards, but the cursors move only once
+        cursors = self._cursors()
+        assert 0 < len(actions_per_policy[0]) <= len(cursors)
+        cursors = cursors[: len(actions_per_policy[0])]
+
+        rewards = np.stack(
+            [
+                self._compute_rewards(cursors, np.asarray(actions))
+                for actions in actions_per_policy
+            ]
+        )
+        infos = [self._compute_stats(action) for action in actions_per_policy[0]]
+        dones = (cursors + 2) == self._n_observations
+
+        self._current_index += len(cursors)
+
+        return self._get_next_obs(), rewards, dones, infos
+
+    def reset(self, start_index: int = 0) -> List[dict]:
+        self._current_index = start_index
+        return self._get_next_obs()
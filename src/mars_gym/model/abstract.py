@@ -7,6 +7,15 @@ from mars_gym.meta_config import ProjectConfig
 
 
 class RecommenderModule(nn.Module, metaclass=abc.ABCMeta):
+    # Modules that set this implement
+    # broadcast_recommendation_score(context_inputs, arm_indices, arm_inputs), which
+    # scores every arm of each observation with the context given only once:
+    # context_inputs maps each context input column to a (batch, ...) tensor,
+    # arm_indices is (batch, n_arms) with the padded arms at index 0, and
+    # arm_inputs maps each arm input column (hist columns, item metadata) to a
+    # (batch, n_arms, ...) tensor. It returns the (batch, n_arms) scores.
+    supports_context_broadcasting = False
+
     def __init__(
         self, project_config: ProjectConfig, index_mapping: Dict[str, Dict[Any, int]],
     ) -> None:
@@ -16,6 +25,6 @@ class RecommenderModule(nn.Module, metaclass=abc.ABCMeta):
         self._n_users = max(index_mapping[project_config.user_column.name].values()) + 1
         self._n_items = max(index_mapping[project_config.item_column.name].values()) + 1
 
-    
+
     def recommendation_score(self, *args):
-        return self.forward(*args)
\ No newline at end of file
+        return self.forward(*args)
@@ -18,13 +18,26 @@ class BanditAgent(object):
         train_loader: DataLoader,
         val_loader: DataLoader,
         epochs: int,
+        train_steps: Optional[int] = None,
     ):
         self.bandit.fit(train_loader.dataset)
 
         if trial:
-            trial.with_generators(
-                train_generator=train_loader, val_generator=val_loader
-            ).run(epochs=epochs)
+            self.fit_reward_model(trial, train_loader, val_loader, epochs, train_steps)
+
+    def fit_reward_model(
+        self,
+        trial: Trial,
+        train_loader: DataLoader,
+        val_loader: DataLoader,
+        epochs: int,
+        train_steps: Optional[int] = None,
+    ):
+        trial.with_generators(
+            train_generator=train_loader,
+            val_generator=val_loader,
+            train_steps=train_steps,
+        ).run(epochs=epochs)
 
     def act(
         self,
@@ -57,3 +70,26 @@ class BanditAgent(object):
             arm_scores=arm_scores,
             with_probs=True,
         )
+
+    def rank_batch(
+        self,
+        arm_indices_list: List[List[int]],
+        arm_scores_list: List[List[float]],
+        arm_contexts_list: List[Optional[Tuple[np.ndarray, ...]]] = None,
+    ) -> Tuple[List[List[int]], List[List[float]]]:
+        # Ranks the positions of the arms of every row at once
+        n_arms = np.array([len(arm_indices) for arm_indices in arm_indices_list])
+        width = int(n_arms.max(initial=0))
+        arm_indices = np.zeros((len(n_arms), width), dtype=np.int64)
+        arm_scores = np.zeros((len(n_arms), width))
+        for row, (indices, scores) in enumerate(zip(arm_indices_list, arm_scores_list)):
+            arm_indices[row, : len(indices)] = indices
+            arm_scores[row, : len(scores)] = scores
+
+        positions, probs = self.bandit.rank_batch(
+            arm_indices, arm_scores, n_arms, arm_contexts_list=arm_contexts_list
+        )
+        return (
+            [row[:n].tolist() for row, n in zip(positions, n_arms)],
+            [row[:n].tolist() for row, n in zip(probs, n_arms)],
+        )
@@ -15,6 +15,10 @@ from mars_gym.utils.utils import chunks
 
 
 class BanditPolicy(object, metaclass=abc.ABCMeta):
+    # Whether the policy reads the arm contexts, besides the arm scores. Only the
+    # policies that set it to False get their candidates without contexts
+    uses_arm_contexts = True
+
     def __init__(self, reward_model: nn.Module) -> None:
         self.reward_model = reward_model
         self._limit = None
@@ -119,8 +123,65 @@ class BanditPolicy(object, metaclass=abc.ABCMeta):
         else:
             return ranked_arms
 
+    def rank_batch(
+        self,
+        arm_indices: np.ndarray,
+        arm_scores: np.ndarray,
+        n_arms: np.ndarray,
+        limit: int = None,
+        arm_contexts_list: List[Optional[Tuple[np.ndarray, ...]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Ranks the arms of many rows, padded to (rows, max arms) matrices.
+
+        Returns the ranked positions of the arms in each row and their
+        probabilities, as ``rank`` with ``with_probs``, padded with -1 and 0.
+        By default, ``rank`` is called on every row, with the arm contexts of
+        the row if ``arm_contexts_list`` is given.
+        """
+        width = self._rank_batch_width(n_arms, limit)
+        positions = np.full((len(n_arms), width), -1, dtype=np.int64)
+        probs = np.zeros((len(n_arms), width))
+        for row, n in enumerate(n_arms):
+            ranked_positions, ranked_probs = self.rank(
+                arms=range(n),
+                arm_indices=arm_indices[row, :n].tolist(),
+                arm_contexts=arm_contexts_list[row]
+                if arm_contexts_list is not None
+                else None,
+                arm_scores=arm_scores[row, :n].tolist(),
+                with_probs=True,
+                limit=limit,
+            )
+            positions[row, : len(ranked_positions)] = ranked_positions
+            probs[row, : len(ranked_probs)] = ranked_probs
+        return positions, probs
+
+    def _rank_batch_width(self, n_arms: np.ndarray, limit: Optional[int]) -> int:
+        width = int(n_arms.max(initial=0))
+        return width if limit is None else min(width, limit)
+
+    def _rank_batch_by_keys(
+        self,
+        keys: np.ndarray,
+        arm_probs: np.ndarray,
+        n_arms: np.ndarray,
+        limit: Optional[int],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Sorts each row by decreasing key, ties in the order of the arms like
+        # successive argmax calls would do. The padding goes last.
+        valid = np.arange(keys.shape[1]) < n_arms[:, None]
+        keys = np.where(valid, keys, -np.inf)
+        width = self._rank_batch_width(n_arms, limit)
+        positions = np.argsort(-keys, axis=1, kind="stable")[:, :width]
+        probs = np.take_along_axis(arm_probs, positions, axis=1)
+
+        ranked_valid = np.arange(width) < n_arms[:, None]
+        return np.where(ranked_valid, positions, -1), np.where(ranked_valid, probs, 0.0)
+
 
 class RandomPolicy(BanditPolicy):
+    uses_arm_contexts = False
+
     def __init__(self, reward_model: nn.Module, seed: int = 42) -> None:
         super().__init__(None)
         self._rng = RandomState(seed)
@@ -190,6 +251,8 @@ class FixedPolicy(BanditPolicy):
 
 
 class ModelPolicy(BanditPolicy):
+    uses_arm_contexts = False
+
     def __init__(self, reward_model: nn.Module, seed: int = 42) -> None:
         super().__init__(reward_model)
         self._rng = RandomState(seed)
@@ -206,8 +269,25 @@ class ModelPolicy(BanditPolicy):
 
         return action
 
+    def rank_batch(
+        self,
+        arm_indices: np.ndarray,
+        arm_scores: np.ndarray,
+        n_arms: np.ndarray,
+        limit: int = None,
+        arm_contexts_list: List[Optional[Tuple[np.ndarray, ...]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Successive argmax calls are a sort. As in _compute_prob, only the
+        # first arm of each row has probability 1.
+        self._limit = limit
+        arm_probs = np.zeros(arm_scores.shape)
+        arm_probs[:, :1] = 1.0
+        return self._rank_batch_by_keys(arm_scores, arm_probs, n_arms, limit)
+
 
 class ExploreThenExploit(BanditPolicy):
+    uses_arm_contexts = False
+
     # TODO: Tune breakpoint parameter
     def __init__(
         self,
@@ -287,6 +367,8 @@ class ExploreThenExploit(BanditPolicy):
 
 
 class EpsilonGreedy(BanditPolicy):
+    uses_arm_contexts = False
+
     def __init__(
         self,
         reward_model: nn.Module,
@@ -335,6 +417,8 @@ class EpsilonGreedy(BanditPolicy):
 
 
 class AdaptiveGreedy(BanditPolicy):
+    uses_arm_contexts = False
+
     # TODO: Tune these parameters: exploration_threshold, decay_rate
     def __init__(
         self,
@@ -395,6 +479,8 @@ class AdaptiveGreedy(BanditPolicy):
 
 
 class PercentileAdaptiveGreedy(BanditPolicy):
+    uses_arm_contexts = False
+
     # TODO: Tune these parameters: window_size, exploration_threshold, percentile, percentile_decay
     def __init__(
         self,
@@ -693,6 +779,8 @@ class LinThompsonSampling(_LinBanditPolicy):
 
 
 class SoftmaxExplorer(BanditPolicy):
+    uses_arm_contexts = False
+
     def __init__(
         self,
         reward_model: nn.Module,
@@ -708,16 +796,38 @@ class SoftmaxExplorer(BanditPolicy):
     def _softmax(self, x: np.ndarray) -> np.ndarray:
         return np.exp(x) / np.sum(np.exp(x), axis=0)
 
+    def _logits(self, arm_scores: np.ndarray) -> np.ndarray:
+        if self._reverse_sigmoid:
+            arm_scores = np.log(arm_scores + 1e-8 / ((1 - arm_scores) + 1e-8))
+
+        return self._logit_multiplier * arm_scores
+
     def _compute_prob(
         self, arm_indices: List[int], arm_scores: List[float]
     ) -> List[float]:
-        arm_scores = np.array(arm_scores)
+        arms_probs = self._softmax(self._logits(np.array(arm_scores)))
+        return arms_probs.tolist()
 
-        if self._reverse_sigmoid:
-            arm_scores = np.log(arm_scores + 1e-8 / ((1 - arm_scores) + 1e-8))
+    def rank_batch(
+        self,
+        arm_indices: np.ndarray,
+        arm_scores: np.ndarray,
+        n_arms: np.ndarray,
+        limit: int = None,
+        arm_contexts_list: List[Optional[Tuple[np.ndarray, ...]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Drawing the arms one by one from the softmax of the remaining ones is the
+        # same as sorting the logits perturbed by Gumbel noise (Gumbel-top-k)
+        self._limit = limit
+        valid = np.arange(arm_scores.shape[1]) < n_arms[:, None]
+        logits = np.where(valid, self._logits(np.where(valid, arm_scores, 0.5)), -np.inf)
 
-        arms_probs = self._softmax(self._logit_multiplier * arm_scores)
-        return arms_probs.tolist()
+        max_logits = np.max(logits, axis=1, keepdims=True, initial=-np.inf)
+        exp_logits = np.exp(logits - np.where(np.isfinite(max_logits), max_logits, 0.0))
+        arm_probs = exp_logits / np.maximum(exp_logits.sum(axis=1, keepdims=True), 1e-300)
+
+        keys = logits + self._rng.gumbel(size=logits.shape)
+        return self._rank_batch_by_keys(keys, arm_probs, n_arms, limit)
 
     def _select_idx(
         self,
@@ -11,6 +11,8 @@ from mars_gym.meta_config import ProjectConfig, IOType, Column
 
 
 class LogisticRegression(RecommenderModule):
+    supports_context_broadcasting = True
+
     def __init__(
         self,
         project_config: ProjectConfig,
@@ -48,3 +50,17 @@ class LogisticRegression(RecommenderModule):
         x = torch.cat((user_emb, item_emb), dim=1,)
 
         return torch.sigmoid(self.linear(x))
+
+    def broadcast_recommendation_score(self, context_inputs, arm_indices, arm_inputs):
+        user_emb = self.user_embeddings(
+            context_inputs[self._project_config.user_column.name]
+        )
+        item_emb = self.item_embeddings(arm_indices)
+
+        # linear(cat(user, item)) is split in its user and item terms, so the
+        # user term is computed once per observation
+        n_factors = user_emb.shape[-1]
+        user_term = F.linear(user_emb, self.linear.weight[:, :n_factors])
+        item_term = F.linear(item_emb, self.linear.weight[:, n_factors:]).squeeze(-1)
+
+        return torch.sigmoid(user_term + item_term + self.linear.bias)
@@ -0,0 +1,244 @@
+from typing import Dict, List, Any
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnarBuffer(object):
+    """Append-only table backed by one typed NumPy array per column.
+
+    The arrays are preallocated and their capacity doubles whenever they get
+    full, so appending a row is amortized O(1) instead of copying the whole
+    table like ``DataFrame.append`` does.
+    """
+
+    def __init__(self, dtypes: Dict[str, Any], initial_capacity: int = 1024) -> None:
+        self._dtypes = {column: np.dtype(dtype) for column, dtype in dtypes.items()}
+        self._capacity = max(1, initial_capacity)
+        self._size = 0
+        self._n_appended = 0
+        self._arrays: Dict[str, np.ndarray] = {
+            column: self._empty(dtype, self._capacity)
+            for column, dtype in self._dtypes.items()
+        }
+        self._data_frame = None
+
+    def _empty(self, dtype: np.dtype, capacity: int) -> np.ndarray:
+        if dtype == np.object_:
+            return np.empty(capacity, dtype=dtype)
+        return np.zeros(capacity, dtype=dtype)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def n_appended(self) -> int:
+        # Every row ever appended, including the ones dropped by keep
+        return self._n_appended
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._dtypes.keys())
+
+    @property
+    def dtypes(self) -> Dict[str, np.dtype]:
+        return dict(self._dtypes)
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = self._capacity
+        while capacity < min_capacity:
+            capacity *= 2
+
+        for column, array in self._arrays.items():
+            new_array = self._empty(array.dtype, capacity)
+            new_array[: self._size] = array[: self._size]
+            self._arrays[column] = new_array
+        self._capacity = capacity
+
+    def append(self, row: Dict[str, Any]) -> None:
+        if self._size == self._capacity:
+            self._grow(self._size + 1)
+
+        for column, array in self._arrays.items():
+            value = row.get(column)
+            if value is None and array.dtype != np.object_:
+                value = 0
+            array[self._size] = value
+
+        self._size += 1
+        self._n_appended += 1
+        self._data_frame = None
+
+    def keep(self, indices: np.ndarray) -> None:
+        # New arrays are allocated, so the views returned before remain valid
+        indices = np.asarray(indices, dtype=np.int64)
+        for column, array in self._arrays.items():
+            new_array = self._empty(array.dtype, self._capacity)
+            new_array[: len(indices)] = array[: self._size][indices]
+            self._arrays[column] = new_array
+        self._size = len(indices)
+        self._data_frame = None
+
+    def column(self, name: str) -> np.ndarray:
+        return self._arrays[name][: self._size]
+
+    def to_data_frame(self) -> pd.DataFrame:
+        # The DataFrame is rebuilt only after new rows arrive, so repeated reads
+        # between appends share the same frame. Building it copies the columns,
+        # since pandas consolidates the arrays of the same dtype into blocks.
+        if self._data_frame is None:
+            self._data_frame = pd.DataFrame(
+                {column: self.column(column) for column in self._arrays.keys()},
+                columns=self.columns,
+            )
+        return self._data_frame
+
+
+class PairCounter(object):
+    """Integer counters for (user, item) pairs.
+
+    The pairs are kept in an open-addressing hash table (linear probing) whose
+    keys and counters are NumPy arrays, so a single update is O(1) and a whole
+    batch of pairs can be gathered with vectorized probing.
+    """
+
+    _EMPTY = -1
+    _HASH_MULTIPLIER = 11400714819323198485  # 2^64 / golden ratio
+    _MAX_LOAD = 0.5
+
+    def __init__(
+        self, n_items: int, n_counters: int = 2, initial_capacity: int = 1024
+    ) -> None:
+        self._n_items = int(n_items)
+        self._n_counters = n_counters
+        self._size = 0
+        self._allocate(max(2, int(initial_capacity)))
+
+    def _allocate(self, capacity: int) -> None:
+        self._bits = int(np.ceil(np.log2(capacity)))
+        self._mask = (1 << self._bits) - 1
+        self._keys = np.full(1 << self._bits, self._EMPTY, dtype=np.int64)
+        self._counts = np.zeros((1 << self._bits, self._n_counters), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def n_counters(self) -> int:
+        return self._n_counters
+
+    def _key(self, users: np.ndarray, items: np.ndarray) -> np.ndarray:
+        return np.asarray(users, dtype=np.int64) * self._n_items + np.asarray(
+            items, dtype=np.int64
+        )
+
+    def _hash(self, keys: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            hashed = keys.astype(np.uint64) * np.uint64(self._HASH_MULTIPLIER)
+        return (hashed >> np.uint64(64 - self._bits)).astype(np.int64)
+
+    def _hash_scalar(self, key: int) -> int:
+        return ((key * self._HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> (64 - self._bits)
+
+    def _find_slots(self, keys: np.ndarray) -> np.ndarray:
+        # Returns the slot holding each key, or the first empty slot of its probe
+        # sequence when the key is not in the table.
+        slots = self._hash(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            slot_keys = self._keys[slots[pending]]
+            resolved = (slot_keys == keys[pending]) | (slot_keys == self._EMPTY)
+            pending = pending[~resolved]
+            slots[pending] = (slots[pending] + 1) & self._mask
+        return slots
+
+    def _resize(self, capacity: int) -> None:
+        used = self._keys != self._EMPTY
+        keys, counts = self._keys[used], self._counts[used]
+        self._allocate(capacity)
+
+        slots = self._hash(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            candidate_slots = slots[pending]
+            free = self._keys[candidate_slots] == self._EMPTY
+            # Several keys may probe the same free slot: only the first one takes it
+            _, first = np.unique(candidate_slots[free], return_index=True)
+            placed = pending[free][first]
+            self._keys[slots[placed]] = keys[placed]
+            self._counts[slots[placed]] = counts[placed]
+
+            pending = np.setdiff1d(pending, placed, assume_unique=True)
+            blocked = self._keys[slots[pending]] != self._EMPTY
+            slots[pending[blocked]] = (slots[pending[blocked]] + 1) & self._mask
+
+    def add(self, user: int, item: int, values) -> None:
+        key = int(user) * self._n_items + int(item)
+        slot = self._hash_scalar(key)
+        while True:
+            slot_key = self._keys[slot]
+            if slot_key == key:
+                break
+            if slot_key == self._EMPTY:
+                if (self._size + 1) > self._MAX_LOAD * len(self._keys):
+                    self._resize(2 * len(self._keys))
+                    self.add(user, item, values)
+                    return
+                self._keys[slot] = key
+                self._size += 1
+                break
+            slot = (slot + 1) & self._mask
+
+        self._counts[slot] += values
+
+    def gather(self, users: np.ndarray, items: np.ndarray) -> np.ndarray:
+        keys = self._key(users, items)
+        result = np.zeros((len(keys), self._n_counters), dtype=np.int64)
+        if self._size == 0 or len(keys) == 0:
+            return result
+
+        slots = self._find_slots(keys)
+        found = self._keys[slots] == keys
+        result[found] = self._counts[slots[found]]
+        return result
+
+    def to_data_frame(
+        self, user_column: str, item_column: str, counter_columns: List[str]
+    ) -> pd.DataFrame:
+        used = self._keys != self._EMPTY
+        keys = self._keys[used]
+        df = pd.DataFrame(self._counts[used], columns=counter_columns)
+        df[user_column] = keys // self._n_items
+        df[item_column] = keys % self._n_items
+        return df.set_index([user_column, item_column])
+
+
+class ItemCounter(object):
+    """Running number of times each item index was observed."""
+
+    def __init__(self, n_items: int) -> None:
+        self._counts = np.zeros(max(1, int(n_items)), dtype=np.int64)
+        self._total = 0
+
+    def __len__(self) -> int:
+        return self._total
+
+    def add(self, item: int) -> None:
+        item = int(item)
+        if item >= len(self._counts):
+            counts = np.zeros(max(item + 1, 2 * len(self._counts)), dtype=np.int64)
+            counts[: len(self._counts)] = self._counts
+            self._counts = counts
+        self._counts[item] += 1
+        self._total += 1
+
+    def count(self, item: int) -> int:
+        item = int(item)
+        return int(self._counts[item]) if 0 <= item < len(self._counts) else 0
+
+    def frequency(self, item: int) -> float:
+        # Same value as value_counts(normalize=True)[item] over all observed items
+        count = self.count(item)
+        if count == 0:
+            return 0.0
+        return float(np.int64(count) / np.int64(self._total))
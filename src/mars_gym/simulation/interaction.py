@@ -1,6 +1,12 @@
 import abc
+import copy
+import json
+import multiprocessing
 import os
-from typing import List, Tuple, Union, Type, Any
+import shutil
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Union, Type, Any, Optional
 
 import functools
 import gym
@@ -11,23 +17,36 @@ import torch
 from sklearn.model_selection import train_test_split
 import torchbearer
 from torchbearer import Trial
+from torch.optim.optimizer import Optimizer
+from torch.utils.data import Dataset
 from tqdm import tqdm
 import time
 import pickle
 import gc
+from mars_gym.data.cache import (
+    file_signature,
+    hash_key,
+    project_config_signature,
+    read_cached,
+)
 from mars_gym.data.dataset import preprocess_interactions_data_frame
 from mars_gym.model.agent import BanditAgent
 from mars_gym.model.bandit import BanditPolicy
+from mars_gym.simulation.buffers import ColumnarBuffer, ItemCounter, PairCounter
+from mars_gym.simulation.logs import ChunkedLogWriter, LOG_FORMATS, read_log
 from mars_gym.simulation.training import (
     TORCH_LOSS_FUNCTIONS,
+    TRAIN_DATA,
+    VAL_DATA,
     SupervisedModelTraining,
 )
 from mars_gym.utils.index_mapping import transform_with_indexing, map_array
 from mars_gym.utils.plot import plot_history, plot_scores
+from mars_gym.utils.profiling import PhaseProfiler
 from mars_gym.utils.reflection import load_attr
 
 tqdm.pandas()
-from mars_gym.gym.envs import RecSysEnv
+from mars_gym.gym.envs import VecRecSysEnv
 from mars_gym.utils.files import (
     get_interaction_dir,
     get_history_path,
@@ -36,6 +55,9 @@ from mars_gym.utils.files import (
     get_simulator_datalog_path,
     get_interator_datalog_path,
     get_ground_truth_datalog_path,
+    get_checkpoint_path,
+    get_params_path,
+    get_data_frame_cache_path,
 )
 from mars_gym.utils.utils import save_trained_data
 
@@ -43,6 +65,59 @@ from mars_gym.utils.utils import save_trained_data
 # from IPython import embed; embed()
 
 
+class SimulatedPolicy(object):
+    # The state of one bandit policy along a simulation. A checkpoint pickles it
+    # whole, except the refit in flight and the datasets of the last refit, which
+    # are rebuilt
+    _TRANSIENT_ATTRIBUTES = [
+        "refit_executor",
+        "pending_refit",
+        "train_data_frame",
+        "val_data_frame",
+        "train_dataset",
+        "val_dataset",
+    ]
+
+    def __init__(
+        self,
+        agent: BanditAgent,
+        output_path: Optional[str] = None,
+        params: Optional[dict] = None,
+    ) -> None:
+        self.agent = agent
+        self.output_path = output_path
+        self.params = params
+
+        self.known_observations: Optional[ColumnarBuffer] = None
+        self.item_counter: Optional[ItemCounter] = None
+        self.hist_counter: Optional[PairCounter] = None
+        self.simulator_log_writer: Optional[ChunkedLogWriter] = None
+        self.static_logs_saved = False
+        self.profiler: Optional[PhaseProfiler] = None
+
+        # Increased whenever the weights of the reward model change
+        self.refit_count = 0
+        self.last_refit_size = 0
+        self.refit_module: Optional[torch.nn.Module] = None
+        self.refit_optimizer: Optional[Optimizer] = None
+        self.refit_optimizer_module: Optional[torch.nn.Module] = None
+        self.retention_random_state: Optional[np.random.RandomState] = None
+        self.retention_seen = 0
+
+        self.refit_executor: Optional[ThreadPoolExecutor] = None
+        self.pending_refit: Optional[tuple] = None
+        self.train_data_frame: Optional[pd.DataFrame] = None
+        self.val_data_frame: Optional[pd.DataFrame] = None
+        self.train_dataset: Optional[Dataset] = None
+        self.val_dataset: Optional[Dataset] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self._TRANSIENT_ATTRIBUTES:
+            state[name] = None
+        return state
+
+
 class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
     loss_function: str = luigi.ChoiceParameter(
         choices=TORCH_LOSS_FUNCTIONS.keys(), default="crm"
@@ -57,87 +132,194 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
     crm_ps_strategy: str = luigi.ChoiceParameter(
         choices=["bandit", "dataset"], default="bandit"
     )
+    # The simulated datasets change at every refit, so they are kept in memory
+    dataset_backend: str = luigi.ChoiceParameter(choices=["memory"], default="memory")
 
     obs_batch_size: int = luigi.IntParameter(default=1000)
     num_episodes: int = luigi.IntParameter(default=1)
     sample_size: int = luigi.IntParameter(default=-1)
     full_refit: bool = luigi.BoolParameter(default=False)
+    act_batch_size: int = luigi.IntParameter(default=1)
+    incremental_refit: bool = luigi.BoolParameter(default=False)
+    replay_window_size: int = luigi.IntParameter(default=10000)
+    refit_steps: int = luigi.IntParameter(default=100)
+    async_refit: bool = luigi.BoolParameter(default=False)
+    max_policy_staleness: int = luigi.IntParameter(default=1000)
+    log_format: str = luigi.ChoiceParameter(choices=LOG_FORMATS, default="csv")
+    checkpoint_interval: int = luigi.IntParameter(default=0)
+    stream_phase_stats: bool = luigi.BoolParameter(default=False)
+    extra_bandit_policies: List[dict] = luigi.ListParameter(default=[])
+    simulation_workers: int = luigi.IntParameter(
+        default=1,
+        description="Processes simulating in parallel. Their logs and metrics are merged, but "
+        "bandit.pkl, and so the test set predictions, come from the first worker only; "
+        "every worker keeps its own model in workers/<worker>",
+    )
+    parallel_split: str = luigi.ChoiceParameter(
+        choices=["episode", "time"], default="episode"
+    )
+    retention_policy: str = luigi.ChoiceParameter(
+        choices=["all", "last_n", "last_t", "reservoir"], default="all"
+    )
+    retention_size: int = luigi.IntParameter(default=100000)
+    retention_time: float = luigi.FloatParameter(default=30 * 24 * 60 * 60)
     output_model_dir: str = luigi.Parameter(default="")
 
-    def create_agent(self) -> BanditAgent:
-        bandit_class = load_attr(self.bandit_policy_class, Type[BanditPolicy])
+    def create_agent(
+        self,
+        bandit_policy_class: Optional[str] = None,
+        bandit_policy_params: Optional[dict] = None,
+        reward_model: Optional[torch.nn.Module] = None,
+    ) -> BanditAgent:
+        bandit_class = load_attr(
+            bandit_policy_class or self.bandit_policy_class, Type[BanditPolicy]
+        )
         bandit = bandit_class(
-            reward_model=self.create_module(), **self.bandit_policy_params
+            reward_model=self.create_module() if reward_model is None else reward_model,
+            **(
+                self.bandit_policy_params
+                if bandit_policy_params is None
+                else bandit_policy_params
+            ),
         )
         return BanditAgent(bandit)
 
     def output(self):
-        return luigi.LocalTarget(get_interaction_dir(self.__class__, self.task_id))
+        # Each policy of a multi-policy simulation and each simulation worker has its own output dir
+        if hasattr(self, "_policy") and self._policy.output_path:
+            return luigi.LocalTarget(self._policy.output_path)
+        return luigi.LocalTarget(self.run_output_path)
 
     @property
-    def known_observations_data_frame(self) -> pd.DataFrame:
-        if not hasattr(self, "_known_observations_data_frame"):
-            columns = self.obs_columns + [
-                self.project_config.item_column.name,
-                self.project_config.output_column.name,
-            ]
+    def run_output_path(self) -> str:
+        # The output dir of the whole run (or worker), whichever policy is simulated
+        if getattr(self, "_worker_output_path", None):
+            return self._worker_output_path
+        return get_interaction_dir(self.__class__, self.task_id)
 
-            self._known_observations_data_frame = pd.DataFrame(columns=columns).astype(
-                self.interactions_data_frame[columns].dtypes
+    @property
+    def simulated_num_episodes(self) -> int:
+        return getattr(self, "_worker_num_episodes", self.num_episodes)
+
+    def _save_params(self):
+        if not (hasattr(self, "_policy") and self._policy.params):
+            return super()._save_params()
+        with open(get_params_path(self.output().path), "w") as params_file:
+            json.dump(
+                {**self.param_kwargs, **self._policy.params},
+                params_file,
+                default=lambda o: dict(o),
+                indent=4,
             )
 
-        return self._known_observations_data_frame
+    def complete(self):
+        # The output dir is created as soon as the run starts, so a run that died
+        # midway (and may be resumed from its checkpoint) is not complete
+        if self.extra_bandit_policies:
+            return all(
+                os.path.exists(
+                    os.path.join(self.run_output_path, "policies", policy_dir, "stats.csv")
+                )
+                for policy_dir in self.policy_dir_names
+            )
+        return os.path.exists(os.path.join(self.run_output_path, "stats.csv"))
 
     @property
-    def hist_data_frame(self) -> pd.DataFrame:
-        if not hasattr(self, "_hist_data_frame"):
-            self._hist_data_frame = pd.DataFrame(
-                columns=[
-                    self.project_config.user_column.name,
-                    self.project_config.item_column.name,
-                    self.project_config.hist_view_column_name,
-                    self.project_config.hist_output_column_name,
-                ],
-                dtype=np.int,
-            ).set_index(
-                [
-                    self.project_config.user_column.name,
-                    self.project_config.item_column.name,
-                ]
+    def known_observations_columns(self) -> List[str]:
+        columns = self.obs_columns + [
+            self.project_config.item_column.name,
+            self.project_config.output_column.name,
+            self.project_config.propensity_score_column_name,
+        ]
+        if self.project_config.available_arms_column_name:
+            columns.append(self.project_config.available_arms_column_name)
+        if (
+            self.retention_policy == "last_t"
+            and self.project_config.timestamp_column_name not in columns
+        ):
+            columns.append(self.project_config.timestamp_column_name)
+        return columns
+
+    @property
+    def policy(self) -> SimulatedPolicy:
+        # The policy being simulated, for the methods that read its state through
+        # the task. Set by the ones that are given the policy
+        if not hasattr(self, "_policy"):
+            self._policy = SimulatedPolicy(self.create_agent())
+        return self._policy
+
+    def _set_policy(self, policy: SimulatedPolicy) -> None:
+        self._policy = policy
+
+    @property
+    def agent(self) -> BanditAgent:
+        return self.policy.agent
+
+    @property
+    def known_observations(self) -> ColumnarBuffer:
+        if self.policy.known_observations is None:
+            dtypes = self.interactions_data_frame.dtypes
+            column_dtypes = {
+                column: dtypes[column] if column in dtypes else np.object_
+                for column in self.known_observations_columns
+            }
+            column_dtypes[self.project_config.propensity_score_column_name] = np.float64
+
+            self.policy.known_observations = ColumnarBuffer(
+                column_dtypes, initial_capacity=self.obs_batch_size
             )
-        return self._hist_data_frame
-
-    def _fill_hist_columns(self, ob_df: pd.DataFrame) -> pd.DataFrame:
-        if len(self.known_observations_data_frame) > 0:
-            ob_df = ob_df.drop(
-                columns=[
-                    self.project_config.hist_view_column_name,
-                    self.project_config.hist_output_column_name,
-                ],
-                errors="ignore",
+
+        return self.policy.known_observations
+
+    @property
+    def known_observations_data_frame(self) -> pd.DataFrame:
+        return self.known_observations.to_data_frame()
+
+    @property
+    def refit_data_frame(self) -> pd.DataFrame:
+        df = self.known_observations_data_frame
+        if self.incremental_refit:
+            # The observations since the last refit plus a bounded replay window of older ones
+            new_observations = (
+                self.known_observations.n_appended - self.policy.last_refit_size
             )
-            ob_df = ob_df.merge(
-                self.hist_data_frame,
-                how="left",
-                left_on=[
-                    self.project_config.user_column.name,
-                    self.project_config.item_column.name,
-                ],
-                right_index=True,
-            ).fillna(0)
-        else:
-            ob_df[self.project_config.hist_view_column_name] = 0
-            ob_df[self.project_config.hist_output_column_name] = 0
-        return ob_df
+            df = df.iloc[max(0, len(df) - new_observations - self.replay_window_size) :]
+        return df
+
+    @property
+    def item_counter(self) -> ItemCounter:
+        if self.policy.item_counter is None:
+            self.policy.item_counter = ItemCounter(self.n_items)
+        return self.policy.item_counter
+
+    @property
+    def hist_counter(self) -> PairCounter:
+        if self.policy.hist_counter is None:
+            self.policy.hist_counter = PairCounter(self.n_items, n_counters=2)
+        return self.policy.hist_counter
+
+    def _fill_hist_columns(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        # The simulated history replaces whatever came with the logged observation
+        for name in (
+            self.project_config.hist_view_column_name,
+            self.project_config.hist_output_column_name,
+        ):
+            columns.pop(name, None)
+        return super()._fill_hist_columns(columns)
 
     def _accumulate_known_observations(
-        self, ob: dict, action: int, prob: float, reward: float
+        self,
+        policy: SimulatedPolicy,
+        ob: dict,
+        action: int,
+        prob: float,
+        reward: float,
+        env_index: Optional[int] = None,
     ):
+        self._set_policy(policy)
         user_column = self.project_config.user_column.name
         item_column = self.project_config.item_column.name
         output_column = self.project_config.output_column.name
-        hist_view_column = self.project_config.hist_view_column_name
-        hist_output_column = self.project_config.hist_output_column_name
         ps_column = self.project_config.propensity_score_column_name
 
         if self.crm_ps_strategy == "bandit":
@@ -146,26 +328,16 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
             ps_val = self._calulate_propensity_score_with_probs(ob, action)
 
         new_row = {**ob, item_column: action, output_column: reward, ps_column: ps_val}
-        
-        self._known_observations_data_frame = self.known_observations_data_frame.append(
-            new_row, ignore_index=True
-        )
+        if self.retention_policy == "last_t" and env_index is not None:
+            new_row[self.project_config.timestamp_column_name] = self.env_timestamps[
+                env_index
+            ]
+        self.known_observations.append(new_row)
+        self.item_counter.add(action)
 
-        user_index = ob[user_column]
-        if (user_index, action) not in self.hist_data_frame.index:
-            self.hist_data_frame.loc[(user_index, action), hist_view_column] = 1
-            self.hist_data_frame.loc[(user_index, action), hist_output_column] = int(
-                reward
-            )
-        else:
-            self.hist_data_frame.loc[(user_index, action), hist_view_column] += 1
-            self.hist_data_frame.loc[(user_index, action), hist_output_column] += int(
-                reward
-            )
+        self.hist_counter.add(ob[user_column], action, (1, int(reward)))
 
     def _calulate_propensity_score(self, ob: dict, prob: float) -> float:
-        df = self.known_observations_data_frame
-
         if self.project_config.available_arms_column_name is None:
             n = 1
         else:
@@ -175,15 +347,7 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
         return ps
 
     def _calulate_propensity_score_with_probs(self, ob: dict, action: int):
-        df = self.known_observations_data_frame
-        try:
-            prob = self._known_observations_data_frame.item_idx.value_counts(
-                normalize=True
-            )[action]
-        except IndexError:
-            prob = 0
-        except KeyError:
-            prob = 0
+        prob = self.item_counter.frequency(action)
 
         n = len(ob[self.project_config.available_arms_column_name])
         prob += 0.001  # error
@@ -191,39 +355,54 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
 
         return ps
 
-    def _create_hist_columns(self):
-        df = self.known_observations_data_frame
-
-        user_column = self.project_config.user_column.name
-        item_column = self.project_config.item_column.name
-        output_column = self.project_config.output_column.name
-        hist_view_column = self.project_config.hist_view_column_name
-        hist_output_column = self.project_config.hist_output_column_name
-        ps_column = self.project_config.propensity_score_column_name
-
-        # ----
-        df[ps_column] = ps_value
-
     # def _calcule_propensity_score(self, df) -> None:
-    def _save_result(self) -> None:
+    def _save_result(self, policy: SimulatedPolicy) -> None:
         print("Saving logs...")
+        self._set_policy(policy)
 
         self._save_params()
         self._save_log()
         self._save_metrics()
         self._save_bandit_model()
 
-        if self.test_size > 0:
-            self._save_test_set_predictions(self.agent)
+        # The workers leave the predictions to the parent, once their logs are merged
+        if self.test_size > 0 and not getattr(self, "_worker_output_path", None):
+            self._save_test_set_predictions(policy.agent)
 
         if self.output_model_dir:
-            save_trained_data(self.output().path, self.output_model_dir)
+            save_trained_data(
+                self.output().path,
+                os.path.join(
+                    self.output_model_dir, os.path.basename(policy.output_path)
+                )
+                if policy.output_path
+                else self.output_model_dir,
+            )
 
     def _save_bandit_model(self):
         # Save Bandit Object
         with open(os.path.join(self.output().path, "bandit.pkl"), "wb") as bandit_file:
             pickle.dump(self.agent.bandit, bandit_file)
 
+    @property
+    def profiler(self) -> PhaseProfiler:
+        if self.policy.profiler is None:
+            self.policy.profiler = PhaseProfiler(
+                os.path.join(self.output().path, "phase_stats.jsonl")
+                if self.stream_phase_stats
+                else None
+            )
+        return self.policy.profiler
+
+    @property
+    def simulator_log_writer(self) -> ChunkedLogWriter:
+        if self.policy.simulator_log_writer is None:
+            self.policy.simulator_log_writer = ChunkedLogWriter(
+                get_simulator_datalog_path(self.output().path, self.log_format),
+                self.log_format,
+            )
+        return self.policy.simulator_log_writer
+
     def _save_log(self) -> None:
         columns = [
             self.project_config.user_column.name,
@@ -232,17 +411,34 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
             self.project_config.propensity_score_column_name,
         ]
 
-        # Env Dataset
-        env_data_df = self.env_data_frame.reset_index()
-        env_data_duplicate_df = pd.concat(
-            [env_data_df] * self.num_episodes, ignore_index=True
-        )
+        # Simulator Dataset: only the observations since the last flush, which are
+        # the last ones of the buffer
+        start, end = self.simulator_log_writer.rows, self.known_observations.n_appended
+        if end > start or start == 0:
+            offset = len(self.known_observations) - (end - start)
+            sim_df = pd.DataFrame(
+                {
+                    name: self.known_observations.column(column)[offset:]
+                    for name, column in zip(["user", "item", "reward", "ps"], columns)
+                }
+            )
+            # The env rows repeated once per episode, like the original log
+            env_index = self.env_data_frame.index.values
+            sim_df["index_env"] = env_index[np.arange(start, end) % len(env_index)]
+            self.simulator_log_writer.write(sim_df)
 
-        # Simulator Dataset
-        sim_df = self.known_observations_data_frame.reset_index(drop=True)
-        sim_df = sim_df[columns]
-        sim_df.columns = ["user", "item", "reward", "ps"]
-        sim_df["index_env"] = env_data_duplicate_df["index"]
+        # The Env and All Datasets don't change during the simulation
+        if not self.policy.static_logs_saved:
+            self._save_static_logs(self.output().path)
+            self.policy.static_logs_saved = True
+
+    def _save_static_logs(self, output_path: str) -> None:
+        columns = [
+            self.project_config.user_column.name,
+            self.project_config.item_column.name,
+            self.project_config.output_column.name,
+            self.project_config.propensity_score_column_name,
+        ]
 
         # All Dataset
         if (
@@ -254,18 +450,34 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
             ] = None
 
         gt_df = self.interactions_data_frame[columns].reset_index()
+        env_data_df = self.env_data_frame.reset_index()
 
-        sim_df.to_csv(get_simulator_datalog_path(self.output().path), index=False)
-        gt_df.to_csv(get_interator_datalog_path(self.output().path), index=False)
-        env_data_df.to_csv(
-            get_ground_truth_datalog_path(self.output().path), index=False
-        )
+        ChunkedLogWriter(
+            get_interator_datalog_path(output_path, self.log_format), self.log_format,
+        ).write(gt_df)
+        ChunkedLogWriter(
+            get_ground_truth_datalog_path(output_path, self.log_format),
+            self.log_format,
+        ).write(env_data_df)
 
     def _save_metrics(self) -> None:
-        df = self.known_observations_data_frame.reset_index()
+        if self.retention_policy == "all":
+            df = self.known_observations_data_frame.reset_index()
+        else:
+            # The buffer only has the retained observations, but the log has all of them
+            df = read_log(self.simulator_log_writer.path, columns=["reward"]).rename(
+                columns={"reward": self.project_config.output_column.name}
+            )
         df_metric = df[[self.project_config.output_column.name]].describe().transpose()
         df_metric["time"] = self.end_time - self.start_time
 
+        self.profiler.to_data_frame().to_csv(
+            self.output().path + "/phase_stats.csv", index=False
+        )
+        self.profiler.windows_data_frame().to_csv(
+            self.output().path + "/phase_windows.csv", index=False
+        )
+
         df_metric.transpose().reset_index().to_csv(
             self.output().path + "/stats.csv", index=False
         )
@@ -310,25 +522,56 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
             os.path.join(self.output().path, "plot_history", "scores_{}.jpg".format(i))
         )
 
-    def get_data_frame_for_indexing(self) -> pd.DataFrame:
+    def get_data_frames_for_indexing(self) -> Iterator[pd.DataFrame]:
+        yield self.interactions_data_frame
+
+    def get_data_frame_for_indexing_signature(self) -> tuple:
+        return (
+            file_signature(self.train_data_frame_path),
+            file_signature(self.val_data_frame_path),
+            self.sample_size,
+            sorted(self.dataset_read_dtypes),
+        )
+
+    def get_data_frame_for_arm_popularity(self) -> pd.DataFrame:
         return self.interactions_data_frame
 
     @property
     def interactions_data_frame(self) -> pd.DataFrame:
         if not hasattr(self, "_interactions_data_frame"):
-            data = pd.concat(
-                [
-                    pd.read_csv(self.train_data_frame_path),
-                    pd.read_csv(self.val_data_frame_path),
-                ],
-                ignore_index=True,
-            )
-            if self.sample_size > 0:
-                data = data[-self.sample_size :]
-
-            self._interactions_data_frame = preprocess_interactions_data_frame(
-                data, self.project_config,
-            )
+            def read_data_frame() -> pd.DataFrame:
+                data = pd.concat(
+                    [
+                        pd.read_csv(
+                            self.train_data_frame_path, dtype=self.dataset_read_dtypes
+                        ),
+                        pd.read_csv(
+                            self.val_data_frame_path, dtype=self.dataset_read_dtypes
+                        ),
+                    ],
+                    ignore_index=True,
+                )
+                if self.sample_size > 0:
+                    data = data[-self.sample_size :]
+
+                return preprocess_interactions_data_frame(data, self.project_config,)
+
+            if self.use_data_frame_cache:
+                # Cached before the indexing, which depends on this frame
+                key = hash_key(
+                    file_signature(self.train_data_frame_path),
+                    file_signature(self.val_data_frame_path),
+                    self.sample_size,
+                    sorted(self.dataset_read_dtypes),
+                    project_config_signature(self.project_config),
+                )
+                self._interactions_data_frame = read_cached(
+                    get_data_frame_cache_path(key),
+                    read_data_frame,
+                    self.data_frame_cache_max_size_in_bytes,
+                )
+            else:
+                self._interactions_data_frame = read_data_frame()
             self._interactions_data_frame.sort_values(
                 self.project_config.timestamp_column_name
             ).reset_index(drop=True)
@@ -345,52 +588,61 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
 
     @property
     def train_data_frame(self) -> pd.DataFrame:
-        if not hasattr(self, "_train_data_frame"):
-            self._train_data_frame = self.interactions_data_frame.sample(1)
-        return self._train_data_frame
+        if self.policy.train_data_frame is None:
+            self.policy.train_data_frame = self.interactions_data_frame.sample(1)
+        return self.policy.train_data_frame
 
     @property
     def val_data_frame(self) -> pd.DataFrame:
-        return self._val_data_frame
+        return self.policy.val_data_frame
+
+    @property
+    def train_dataset(self) -> Dataset:
+        if self.policy.train_dataset is None:
+            self.policy.train_dataset = self._create_dataset(
+                self.train_data_frame, TRAIN_DATA
+            )
+        return self.policy.train_dataset
+
+    @property
+    def val_dataset(self) -> Dataset:
+        if self.policy.val_dataset is None:
+            self.policy.val_dataset = self._create_dataset(
+                self.val_data_frame, VAL_DATA
+            )
+        return self.policy.val_dataset
 
     def _reset_dataset(self):
+        df = self.refit_data_frame
         # Random Split
         if self.val_split_type == "random":
-            self._train_data_frame, self._val_data_frame = train_test_split(
-                self.known_observations_data_frame,
+            self.policy.train_data_frame, self.policy.val_data_frame = train_test_split(
+                df,
                 test_size=self.val_size,
                 random_state=self.seed,
-                stratify=self.known_observations_data_frame[
-                    self.project_config.output_column.name
-                ]
-                if np.sum(
-                    self.known_observations_data_frame[
-                        self.project_config.output_column.name
-                    ]
-                )
-                > 1
+                stratify=df[self.project_config.output_column.name]
+                if np.sum(df[self.project_config.output_column.name]) > 1
                 else None,
             )
         else:
             # Time Split
-            df = self.known_observations_data_frame
             size = len(df)
             cut = int(size - size * self.val_size)
-            self._train_data_frame, self._val_data_frame = df.iloc[:cut], df.iloc[cut:]
-
-        if hasattr(self, "_train_dataset"):
-            del self._train_dataset
+            self.policy.train_data_frame, self.policy.val_data_frame = (
+                df.iloc[:cut],
+                df.iloc[cut:],
+            )
 
-        if hasattr(self, "_val_dataset"):
-            del self._val_dataset
+        self.policy.train_dataset = None
+        self.policy.val_dataset = None
 
     def clean(self):
         super().clean()
         if hasattr(self, "_interactions_data_frame"):
             del self._interactions_data_frame
 
-        if hasattr(self, "_known_observations_data_frame"):
-            del self._known_observations_data_frame
+        if hasattr(self, "_policy"):
+            del self._policy
 
         gc.collect()
 
@@ -429,10 +681,10 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
                 ]
                 .describe()
                 .transpose(),
-                self._train_data_frame[[self.project_config.output_column.name]]
+                self.train_data_frame[[self.project_config.output_column.name]]
                 .describe()
                 .transpose(),
-                self._val_data_frame[[self.project_config.output_column.name]]
+                self.val_data_frame[[self.project_config.output_column.name]]
                 .describe()
                 .transpose(),
             ]
@@ -440,21 +692,292 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
         stats["dataset"] = ["all", "train", "valid"]
         stats = stats.set_index("dataset")
 
-        percent = len(self.known_observations_data_frame) / (len(self.env_data_frame) * self.num_episodes)
+        percent = self.known_observations.n_appended / (
+            len(self.env_data_frame) * self.simulated_num_episodes
+        )
 
         print("\nInteraction Stats ({}%)".format(np.round(percent * 100, 2)))
         print(stats[["count", "mean", "std"]], "\n")
 
+    @property
+    def bandit_policies(self) -> List[Tuple[str, dict]]:
+        return [(self.bandit_policy_class, dict(self.bandit_policy_params))] + [
+            (
+                policy["bandit_policy_class"],
+                dict(policy.get("bandit_policy_params", {})),
+            )
+            for policy in self.extra_bandit_policies
+        ]
+
+    @property
+    def policy_dir_names(self) -> List[str]:
+        return [
+            "{}_{}".format(i, bandit_policy_class.split(".")[-1])
+            for i, (bandit_policy_class, _) in enumerate(self.bandit_policies)
+        ]
+
+    def _create_policies(self) -> List[SimulatedPolicy]:
+        if not self.extra_bandit_policies:
+            # A single policy writes directly to the task output
+            return [SimulatedPolicy(self.create_agent())]
+
+        # The policies start from the same reward model, so their scores are shared
+        # until their first refit
+        reward_model = self.create_module()
+        policies = []
+        for policy_dir, (bandit_policy_class, bandit_policy_params) in zip(
+            self.policy_dir_names, self.bandit_policies
+        ):
+            output_path = os.path.join(self.run_output_path, "policies", policy_dir)
+            os.makedirs(output_path, exist_ok=True)
+            policies.append(
+                SimulatedPolicy(
+                    self.create_agent(
+                        bandit_policy_class,
+                        bandit_policy_params,
+                        copy.deepcopy(reward_model),
+                    ),
+                    output_path,
+                    {
+                        "bandit_policy_class": bandit_policy_class,
+                        "bandit_policy_params": bandit_policy_params,
+                    },
+                )
+            )
+        return policies
+
+    @property
+    def _hist_columns_are_inputs(self) -> bool:
+        input_column_names = [column.name for column in self.project_config.input_columns]
+        return (
+            self.project_config.hist_view_column_name in input_column_names
+            or self.project_config.hist_output_column_name in input_column_names
+        )
+
+    def _act_batch_with_shared_candidates(
+        self,
+        policy: SimulatedPolicy,
+        obs: List[dict],
+        arms_list: List[List[Any]],
+        shared: dict,
+    ) -> Tuple[List[int], List[float]]:
+        # The candidates are shared by the policies unless they depend on each policy's
+        # own history, and the scores by the policies whose reward models were never
+        # refit, which are identical
+        self._set_policy(policy)
+        broadcast = self._uses_context_broadcasting(policy.agent)
+        candidates_key = (
+            None if self._hist_columns_are_inputs else ("candidates", broadcast)
+        )
+        if candidates_key in shared:
+            candidates = shared[candidates_key]
+        else:
+            candidates = self._prepare_candidates(obs, arms_list, broadcast=broadcast)
+            if candidates_key:
+                shared[candidates_key] = candidates
+        arm_contexts_list, _, arm_indices_list, obs_dataset = candidates
+
+        scores_key = (
+            ("scores", broadcast)
+            if candidates_key
+            and policy.agent.bandit.reward_model
+            and policy.refit_count == 0
+            else None
+        )
+        if scores_key in shared:
+            arm_scores_list = shared[scores_key]
+        else:
+            arm_scores_list = self._score_candidates(
+                policy.agent, obs_dataset, arm_contexts_list, arm_indices_list
+            )
+            if scores_key:
+                shared[scores_key] = arm_scores_list
+
+        return self._select_actions(
+            policy.agent, arm_contexts_list, arm_indices_list, arm_scores_list
+        )
+
     def run(self):
-        os.makedirs(self.output().path, exist_ok=True)
+        os.makedirs(self.run_output_path, exist_ok=True)
         self.start_time = time.time()
 
-        self._save_params()
         print("DataFrame: env_data_frame, ", self.env_data_frame.shape)
         print("DataFrame: interactions_data_frame, ", self.interactions_data_frame.shape)
 
-        self.env: RecSysEnv = gym.make(
-            "recsys-v0",
+        if self.simulation_workers > 1:
+            self._run_workers()
+        else:
+            self._simulate()
+
+    def _run_workers(self) -> None:
+        # The data is prepared before forking, so the workers share it
+        self.index_mapping
+        self.reverse_index_mapping
+        self.embeddings_for_metadata
+
+        worker_paths = [
+            os.path.join(self.run_output_path, "workers", str(worker))
+            for worker in range(self.simulation_workers)
+        ]
+        seeds = [
+            int(seed_sequence.generate_state(1)[0])
+            for seed_sequence in np.random.SeedSequence(self.seed).spawn(
+                self.simulation_workers
+            )
+        ]
+
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(
+                target=self._run_worker, args=(worker, worker_paths[worker], seed)
+            )
+            for worker, seed in enumerate(seeds)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        failed = [
+            worker for worker, process in enumerate(processes) if process.exitcode != 0
+        ]
+        if failed:
+            raise RuntimeError("Simulation workers {} failed".format(failed))
+
+        self.end_time = time.time()
+        self._save_params()
+        if self.extra_bandit_policies:
+            output_paths = [
+                os.path.join(self.run_output_path, "policies", policy_dir)
+                for policy_dir in self.policy_dir_names
+            ]
+            for policy_dir, output_path in zip(self.policy_dir_names, output_paths):
+                self._merge_worker_outputs(
+                    [os.path.join(path, "policies", policy_dir) for path in worker_paths],
+                    output_path,
+                )
+        else:
+            output_paths = [self.run_output_path]
+            self._merge_worker_outputs(worker_paths, self.run_output_path)
+
+        if self.test_size > 0:
+            for output_path in output_paths:
+                self._save_merged_test_set_predictions(output_path)
+
+    def _save_merged_test_set_predictions(self, output_path: str) -> None:
+        # With the kept bandit, and the hist counts of the interactions of every worker
+        if not os.path.exists(os.path.join(output_path, "bandit.pkl")):
+            return
+        with open(os.path.join(output_path, "bandit.pkl"), "rb") as bandit_file:
+            bandit = pickle.load(bandit_file)
+
+        sim_df = read_log(
+            get_simulator_datalog_path(output_path, self.log_format),
+            columns=["user", "item", "reward"],
+        )
+        hist_df = (
+            sim_df.assign(view=1, reward=sim_df["reward"].astype(int))
+            .groupby(["user", "item"])[["view", "reward"]]
+            .sum()
+        )
+        hist_counter = PairCounter(self.n_items, n_counters=2)
+        for (user, item), counts in zip(hist_df.index, hist_df.values):
+            hist_counter.add(user, item, counts)
+
+        policy = SimulatedPolicy(BanditAgent(bandit), output_path)
+        policy.hist_counter = hist_counter
+        self._set_policy(policy)
+        self._save_test_set_predictions(policy.agent)
+
+    def _run_worker(self, worker: int, output_path: str, seed: int) -> None:
+        random.seed(seed)
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+        self._arm_sampler_seed = seed
+
+        if self.parallel_split == "episode":
+            # The episodes are dealt round-robin
+            self._worker_num_episodes = len(
+                range(worker, self.num_episodes, self.simulation_workers)
+            )
+        else:
+            # Each worker simulates every episode over a disjoint time range
+            bounds = np.linspace(
+                0, len(self.env_data_frame), self.simulation_workers + 1
+            ).astype(int)
+            self._env_data_frame = self.env_data_frame.iloc[
+                bounds[worker] : bounds[worker + 1]
+            ]
+
+        self._worker_output_path = output_path
+        os.makedirs(output_path, exist_ok=True)
+        self.start_time = time.time()
+        if self.simulated_num_episodes > 0 and len(self.env_data_frame) > 1:
+            self._simulate()
+
+    def _merge_worker_outputs(self, worker_paths: List[str], output_path: str) -> None:
+        os.makedirs(output_path, exist_ok=True)
+        worker_paths = [
+            path
+            for path in worker_paths
+            if os.path.exists(get_simulator_datalog_path(path, self.log_format))
+        ]
+
+        sim_df = pd.concat(
+            [
+                read_log(get_simulator_datalog_path(path, self.log_format))
+                for path in worker_paths
+            ],
+            ignore_index=True,
+        )
+        ChunkedLogWriter(
+            get_simulator_datalog_path(output_path, self.log_format), self.log_format
+        ).write(sim_df)
+        self._save_static_logs(output_path)
+
+        for file_name in ["phase_stats.csv", "phase_windows.csv"]:
+            pd.concat(
+                [
+                    pd.read_csv(os.path.join(path, file_name)).assign(worker=worker)
+                    for worker, path in enumerate(worker_paths)
+                ],
+                ignore_index=True,
+            ).to_csv(os.path.join(output_path, file_name), index=False)
+
+        df_metric = (
+            sim_df[["reward"]]
+            .rename(columns={"reward": self.project_config.output_column.name})
+            .describe()
+            .transpose()
+        )
+        df_metric["time"] = self.end_time - self.start_time
+        df_metric.transpose().reset_index().to_csv(
+            os.path.join(output_path, "stats.csv"), index=False
+        )
+
+        # The trained models can't be merged, so the ones of the first worker are kept
+        # for the test set predictions. models.json says where each one comes from
+        for file_name in ["params.json", "bandit.pkl"]:
+            if os.path.exists(os.path.join(worker_paths[0], file_name)):
+                shutil.copy(
+                    os.path.join(worker_paths[0], file_name),
+                    os.path.join(output_path, file_name),
+                )
+        with open(os.path.join(output_path, "models.json"), "w") as models_file:
+            json.dump(
+                {
+                    "bandit.pkl": os.path.join(worker_paths[0], "bandit.pkl"),
+                    "worker_models": [
+                        os.path.join(path, "bandit.pkl") for path in worker_paths
+                    ],
+                },
+                models_file,
+                indent=4,
+            )
+
+    def _simulate(self) -> None:
+        self.env: VecRecSysEnv = gym.make(
+            "recsys-vec-v0",
             dataset=self.env_data_frame,
             available_items_column=self.project_config.available_arms_column_name,
             item_column=self.project_config.item_column.name,
@@ -463,67 +986,349 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
             ].max()
             + 1,
             item_metadata=self.embeddings_for_metadata,
+            num_envs=self.act_batch_size,
         )
         self.env.seed(42)
 
-        self.agent: BanditAgent = self.create_agent()
+        policies = self._create_policies()
+        for policy in policies:
+            self._set_policy(policy)
+            self._save_params()
 
-        rewards = []
+        rewards = [[] for _ in policies]
         interactions = 0
-        k = 0
-        for i in range(self.num_episodes):
-            ob = self.env.reset()
+        start_episode, start_index = 0, 0
+        checkpoint = self._load_checkpoint(policies)
+        if checkpoint:
+            start_episode, start_index = checkpoint["episode"], checkpoint["env_index"]
+            interactions, rewards = checkpoint["interactions"], checkpoint["rewards"]
+            self.start_time -= checkpoint["elapsed_time"]
+            last_checkpoint = interactions
+            print("Resuming from interaction {}...".format(interactions))
+        else:
+            last_checkpoint = 0
+
+        for i in range(start_episode, self.simulated_num_episodes):
+            obs = self.env.reset(start_index=start_index if i == start_episode else 0)
 
             while True:
-                interactions += 1
-
-                # TODO
-                if self.project_config.available_arms_column_name in ob:
-                    # The Env returns a binary array to be compatible with OpenAI Gym API but the actual items are needed
-                    ob[self.project_config.available_arms_column_name] = [
-                        self.reverse_index_mapping[self.project_config.item_column.name][index]
-                        for index in np.flatnonzero(
-                            ob[self.project_config.available_arms_column_name]
-                        ).tolist()
-                    ]
-
-                
-                action, prob = self._act(self.agent, ob)
-
-                new_ob, reward, done, info = self.env.step(action)
-                rewards.append(reward)
-                self._accumulate_known_observations(ob, action, prob, reward)
-
-                if done:
+                # Never act past the next refit, so the model is the same as when stepping one by one
+                batch_size = self.obs_batch_size - interactions % self.obs_batch_size
+                for policy in policies:
+                    if policy.pending_refit:
+                        # Nor past the maximum staleness of the acting model
+                        batch_size = min(
+                            batch_size,
+                            max(
+                                1,
+                                policy.pending_refit[1]
+                                + self.max_policy_staleness
+                                - interactions,
+                            ),
+                        )
+                obs = obs[:batch_size]
+                interactions += len(obs)
+
+                for ob in obs:
+                    if self.project_config.available_arms_column_name in ob:
+                        # The Env returns the indices of the available items, but the actual items are needed
+                        ob[self.project_config.available_arms_column_name] = self.reverse_index_mapping[
+                            self.project_config.item_column.name
+                        ][ob[self.project_config.available_arms_column_name]].tolist()
+
+                arms_list = self._get_arms_batch(obs)
+                shared: dict = {}
+                actions_per_policy, probs_per_policy = [], []
+                for policy in policies:
+                    with self._phase(policy, "act"):
+                        actions, probs = self._act_batch_with_shared_candidates(
+                            policy, obs, arms_list, shared
+                        )
+                    actions_per_policy.append(actions)
+                    probs_per_policy.append(probs)
+
+                env_index = self.env.current_index
+                with self._phase(policies[0], "env_step"):
+                    new_obs, rewards_per_policy, dones, infos = self.env.step_policies(
+                        actions_per_policy
+                    )
+                env_indices = range(env_index, env_index + len(obs))
+                for j, policy in enumerate(policies):
+                    rewards[j].extend(rewards_per_policy[j])
+                    with self._phase(policy, "accumulate"):
+                        for ob, action, prob, reward, ob_env_index in zip(
+                            obs,
+                            actions_per_policy[j],
+                            probs_per_policy[j],
+                            rewards_per_policy[j],
+                            env_indices,
+                        ):
+                            self._accumulate_known_observations(
+                                policy, ob, action, prob, reward, env_index=ob_env_index
+                            )
+
+                if dones[-1]:
                     break
 
-                ob = new_ob
+                obs = new_obs
 
-                if interactions % self.obs_batch_size == 0:
-                    # self._create_hist_columns()
-                    self._reset_dataset()
-                    if self.agent.bandit.reward_model:
-                        if self.full_refit:
-                            self.agent.bandit.reward_model = self.create_module()
+                for policy in policies:
+                    if interactions % self.obs_batch_size == 0:
+                        self._refit(policy, interactions)
 
-                        trial = self.create_trial(self.agent.bandit.reward_model)
-                    else:
-                        trial = None
+                    self._poll_async_refit(policy, interactions)
 
-                    self.agent.fit(
-                        trial,
-                        self.get_train_generator(),
-                        self.get_val_generator(),
-                        self.epochs,
-                    )
-                    self._save_trial_log(interactions, trial)
-                    self._print_hist()
+                if (
+                    self.checkpoint_interval > 0
+                    and interactions - last_checkpoint >= self.checkpoint_interval
+                ):
+                    self._save_checkpoint(policies, i, interactions, rewards)
+                    last_checkpoint = interactions
 
-                    # print(k, "===>", interactions, np.mean(rewards), np.sum(rewards))
-                    k += 1
-                    self._save_log()
+        for policy in policies:
+            self._poll_async_refit(policy, interactions, wait=True)
+            if policy.refit_executor:
+                policy.refit_executor.shutdown()
+                policy.refit_executor = None
 
         self.env.close()
         self.end_time = time.time()
         # Save logs
-        self._save_result()
+        for policy in policies:
+            self._save_result(policy)
+
+        if os.path.exists(get_checkpoint_path(self.run_output_path)):
+            os.remove(get_checkpoint_path(self.run_output_path))
+
+    def _phase(self, policy: SimulatedPolicy, name: str):
+        self._set_policy(policy)
+        return self.profiler.phase(name)
+
+    def _save_checkpoint(
+        self,
+        policies: List[SimulatedPolicy],
+        episode: int,
+        interactions: int,
+        rewards: List[List[float]],
+    ):
+        for policy in policies:
+            with self._phase(policy, "checkpoint"):
+                # The pending refit is finished and the log is flushed, so the checkpoint
+                # matches what is on disk
+                self._poll_async_refit(policy, interactions, wait=True)
+                self._save_log()
+
+        checkpoint = {
+            "episode": episode,
+            "env_index": self.env.current_index,
+            "interactions": interactions,
+            "rewards": rewards,
+            "elapsed_time": time.time() - self.start_time,
+            "policies": policies,
+            "random_state": random.getstate(),
+            "numpy_random_state": np.random.get_state(),
+            "arm_sampler_random_state": self._arm_sampler.rng.bit_generator.state
+            if hasattr(self, "_arm_sampler")
+            else None,
+            "torch_random_state": torch.get_rng_state(),
+            "cuda_random_state": torch.cuda.get_rng_state_all()
+            if torch.cuda.is_available()
+            else None,
+        }
+
+        # Written to a temporary file and then renamed, so a crash never leaves a partial checkpoint
+        checkpoint_path = get_checkpoint_path(self.run_output_path)
+        with open(checkpoint_path + ".tmp", "wb") as checkpoint_file:
+            pickle.dump(checkpoint, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+    def _load_checkpoint(self, policies: List[SimulatedPolicy]) -> Optional[dict]:
+        checkpoint_path = get_checkpoint_path(self.run_output_path)
+        if not os.path.exists(checkpoint_path):
+            return None
+
+        with open(checkpoint_path, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+
+        policies[:] = checkpoint["policies"]
+        for policy in policies:
+            self._set_policy(policy)
+            self.simulator_log_writer.rollback()
+
+        random.setstate(checkpoint["random_state"])
+        np.random.set_state(checkpoint["numpy_random_state"])
+        if checkpoint.get("arm_sampler_random_state") is not None:
+            self.arm_sampler.rng.bit_generator.state = checkpoint[
+                "arm_sampler_random_state"
+            ]
+        torch.set_rng_state(checkpoint["torch_random_state"])
+        if checkpoint["cuda_random_state"] is not None:
+            torch.cuda.set_rng_state_all(checkpoint["cuda_random_state"])
+
+        return checkpoint
+
+    def _get_optimizer(self, module) -> Optimizer:
+        if not self.incremental_refit:
+            return super()._get_optimizer(module)
+        # The optimizer state (e.g. Adam moments) is carried across refits of the same module
+        if self.policy.refit_optimizer_module is not module:
+            self.policy.refit_optimizer = super()._get_optimizer(module)
+            self.policy.refit_optimizer_module = module
+        return self.policy.refit_optimizer
+
+    @property
+    def _refit_epochs_and_steps(self) -> Tuple[int, Optional[int]]:
+        if self.incremental_refit:
+            return 1, self.refit_steps
+        return self.epochs, None
+
+    @property
+    def env_timestamps(self) -> np.ndarray:
+        if not hasattr(self, "_env_timestamps"):
+            self._env_timestamps = self.interactions_data_frame.loc[
+                self.env_data_frame.index, self.project_config.timestamp_column_name
+            ].to_numpy()
+        return self._env_timestamps
+
+    def _retained_indices(self) -> np.ndarray:
+        size = len(self.known_observations)
+        if self.retention_policy == "last_n":
+            return np.arange(max(0, size - self.retention_size), size)
+
+        if self.retention_policy == "last_t":
+            timestamps = self.known_observations.column(
+                self.project_config.timestamp_column_name
+            )
+            if not np.issubdtype(timestamps.dtype, np.number):
+                # Datetimes are compared in seconds
+                timestamps = (
+                    pd.to_datetime(timestamps).values.astype("datetime64[ns]").astype(np.int64)
+                    / 1e9
+                )
+            return np.flatnonzero(timestamps >= timestamps.max() - self.retention_time)
+
+        # Reservoir sampling (Algorithm R) over every observation appended so far,
+        # where the new observations are the last ones of the buffer
+        if self.policy.retention_random_state is None:
+            self.policy.retention_random_state = np.random.RandomState(self.seed)
+        n_appended = self.known_observations.n_appended
+        n_new = n_appended - self.policy.retention_seen
+        # The reservoir is filled first, then each new observation takes the slot it
+        # draws, if any. All the slots are drawn at once
+        n_filled = min(size, max(size - n_new, self.retention_size))
+        slots = np.arange(n_filled)
+        positions = np.arange(n_filled, size)
+        draws = self.policy.retention_random_state.randint(
+            0, np.arange(n_appended - len(positions), n_appended) + 1
+        )
+        replaced = draws < self.retention_size
+        draws, positions = draws[replaced], positions[replaced]
+        # When a slot is drawn more than once, the last observation keeps it
+        last = len(draws) - 1 - np.unique(draws[::-1], return_index=True)[1]
+        slots[draws[last]] = positions[last]
+
+        self.policy.retention_seen = n_appended
+        return np.sort(slots)
+
+    def _apply_retention(self) -> None:
+        # The log keeps every observation, so it is flushed before the buffer drops any
+        self._save_log()
+        self.known_observations.keep(self._retained_indices())
+
+    def _refit(self, policy: SimulatedPolicy, interactions: int) -> None:
+        # Only one refit in flight: the datasets of the previous one are about to be replaced
+        self._poll_async_refit(policy, interactions, wait=True)
+        self._set_policy(policy)
+
+        if self.retention_policy != "all":
+            self._apply_retention()
+
+        self._reset_dataset()
+        policy.last_refit_size = self.known_observations.n_appended
+
+        if self.async_refit and policy.agent.bandit.reward_model:
+            with self.profiler.phase("fit"):
+                self._submit_async_refit(policy, interactions)
+            return
+
+        if policy.agent.bandit.reward_model:
+            if self.full_refit:
+                policy.agent.bandit.reward_model = self.create_module()
+
+            trial = self.create_trial(policy.agent.bandit.reward_model)
+        else:
+            trial = None
+
+        epochs, train_steps = self._refit_epochs_and_steps
+        with self.profiler.phase("fit"):
+            policy.agent.fit(
+                trial,
+                self.get_train_generator(),
+                self.get_val_generator(),
+                epochs,
+                train_steps=train_steps,
+            )
+        policy.refit_count += 1
+        self._save_refit_logs(interactions, trial)
+
+    def _submit_async_refit(self, policy: SimulatedPolicy, interactions: int) -> None:
+        # The reward model is trained on a separate copy in a background thread,
+        # while the agent keeps acting with the last published weights
+        if self.full_refit or policy.refit_module is None:
+            policy.refit_module = (
+                self.create_module()
+                if self.full_refit
+                else copy.deepcopy(policy.agent.bandit.reward_model)
+            )
+        trial = self.create_trial(policy.refit_module)
+        train_loader = self.get_train_generator()
+        epochs, train_steps = self._refit_epochs_and_steps
+
+        if policy.refit_executor is None:
+            policy.refit_executor = ThreadPoolExecutor(max_workers=1)
+        future = policy.refit_executor.submit(
+            policy.agent.fit_reward_model,
+            trial,
+            train_loader,
+            self.get_val_generator(),
+            epochs,
+            train_steps,
+        )
+        policy.pending_refit = (future, interactions, trial, train_loader.dataset)
+
+    def _poll_async_refit(
+        self, policy: SimulatedPolicy, interactions: int, wait: bool = False
+    ) -> None:
+        if policy.pending_refit is None:
+            return
+        future, started_at, trial, train_dataset = policy.pending_refit
+        if not (
+            wait
+            or future.done()
+            or interactions - started_at >= self.max_policy_staleness
+        ):
+            return
+
+        self._set_policy(policy)
+        with self.profiler.phase("refit_wait"):
+            future.result()
+        policy.pending_refit = None
+
+        # Hot-swap the trained weights into the acting model
+        policy.agent.bandit.fit(train_dataset)
+        policy.agent.bandit.reward_model.load_state_dict(
+            policy.refit_module.state_dict()
+        )
+        policy.refit_count += 1
+        self._save_refit_logs(started_at, trial)
+
+    def _save_refit_logs(self, interactions: int, trial: Optional[Trial]) -> None:
+        with self.profiler.phase("save_trial_log"):
+            self._save_trial_log(interactions, trial)
+        self._print_hist()
+
+        with self.profiler.phase("save_log"):
+            self._save_log()
+        self.profiler.end_window(interactions)
@@ -0,0 +1,88 @@
+import os
+import shutil
+from typing import List, Optional
+
+import pandas as pd
+
+LOG_FORMATS = ["csv", "parquet"]
+
+
+class ChunkedLogWriter(object):
+    """Append-only log written in chunks.
+
+    Each ``write`` only flushes the rows it receives: a ``csv`` log is appended to
+    (the header is written once), while a ``parquet`` log is a directory with one
+    compressed part file per chunk. Both are read back with ``read_log``.
+    """
+
+    def __init__(
+        self, path: str, log_format: str = "csv", compression: str = "snappy"
+    ) -> None:
+        assert log_format in LOG_FORMATS
+        self._path = path
+        self._log_format = log_format
+        self._compression = compression
+        self._rows = 0
+        self._chunks = 0
+        self._bytes = 0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    def _clear(self) -> None:
+        # A new writer replaces the log of a previous run
+        if os.path.isdir(self._path):
+            shutil.rmtree(self._path)
+        elif os.path.exists(self._path):
+            os.remove(self._path)
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._chunks == 0:
+            self._clear()
+
+        if self._log_format == "csv":
+            df.to_csv(
+                self._path, mode="a", header=self._chunks == 0, index=False,
+            )
+            self._bytes = os.path.getsize(self._path)
+        else:
+            os.makedirs(self._path, exist_ok=True)
+            df.to_parquet(
+                os.path.join(self._path, "part-{:05d}.parquet".format(self._chunks)),
+                compression=self._compression,
+                index=False,
+            )
+
+        self._rows += len(df)
+        self._chunks += 1
+
+    def rollback(self) -> None:
+        # Drops whatever was written after the state of this writer was saved
+        # (e.g. in a checkpoint), so the log can be resumed from it
+        if self._chunks == 0:
+            self._clear()
+        elif self._log_format == "csv":
+            os.truncate(self._path, self._bytes)
+        else:
+            for part in os.listdir(self._path):
+                if int(part[len("part-") : -len(".parquet")]) >= self._chunks:
+                    os.remove(os.path.join(self._path, part))
+
+
+def read_log(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    if os.path.isdir(path):
+        parts = sorted(
+            os.path.join(path, part)
+            for part in os.listdir(path)
+            if part.endswith(".parquet")
+        )
+        return pd.concat(
+            [pd.read_parquet(part, columns=columns) for part in parts],
+            ignore_index=True,
+        )
+    return pd.read_csv(path, usecols=columns)
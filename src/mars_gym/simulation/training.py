@@ -1,6 +1,7 @@
 import abc
 import functools
 import gc
+import itertools
 import json
 import logging
 import os
@@ -10,7 +11,7 @@ import shutil
 from contextlib import redirect_stdout
 from copy import deepcopy
 from multiprocessing import Pool
-from typing import Type, Dict, List, Optional, Tuple, Union, Any, cast
+from typing import Type, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union, Any, Callable, cast
 import math
 import luigi
 import numpy as np
@@ -29,7 +30,7 @@ from torch.utils.data import DataLoader
 from torch.utils.data._utils.collate import default_convert
 from torch.utils.data.dataset import Dataset, ChainDataset
 from torchbearer import Trial
-from torchbearer.callbacks import GradientNormClipping
+from torchbearer.callbacks import Callback, GradientNormClipping
 from torchbearer.callbacks.checkpointers import ModelCheckpoint
 from torchbearer.callbacks.csv_logger import CSVLogger
 from torchbearer.callbacks.early_stopping import EarlyStopping
@@ -49,11 +50,29 @@ from mars_gym.data.dataset import (
     literal_eval_array_columns,
     InteractionsDataset,
 )
+from mars_gym.data.cache import (
+    file_signature,
+    hash_key,
+    project_config_signature,
+    read_cached,
+)
+from mars_gym.data.storage import (
+    ArrayColumns,
+    DATASET_BACKENDS,
+    MemoryMappedColumns,
+    memory_mapped_columns_exist,
+    write_memory_mapped_columns,
+)
+from mars_gym.evaluation.predictions import (
+    PREDICTIONS_FORMATS,
+    write_test_set_predictions,
+)
 from mars_gym.gym.envs.recsys import ITEM_METADATA_KEY
 from mars_gym.meta_config import Column, IOType, ProjectConfig
 from mars_gym.model.abstract import RecommenderModule
 from mars_gym.model.agent import BanditAgent
 from mars_gym.model.bandit import BanditPolicy
+from mars_gym.simulation.buffers import PairCounter
 from mars_gym.torch.data import NoAutoCollationDataLoader, FasterBatchSampler
 from mars_gym.torch.init import lecun_normal_init, he_init
 from mars_gym.torch.loss import (
@@ -73,16 +92,19 @@ from mars_gym.utils.files import (
     get_task_dir,
     get_test_set_predictions_path,
     get_index_mapping_path,
+    get_data_frame_cache_path,
 )
 from mars_gym.utils.index_mapping import (
     create_index_mapping,
     create_index_mapping_from_arrays,
+    create_reverse_index_mapping,
     transform_with_indexing,
     map_array,
 )
 from mars_gym.utils.plot import plot_history
 from mars_gym.utils import files
 from mars_gym.utils.reflection import load_attr
+from mars_gym.utils.sampling import ARM_SAMPLING_STRATEGIES, ArmSampler
 
 logging.basicConfig(
     format="%(asctime)s : %(levelname)s : %(message)s", level=logging.INFO
@@ -125,6 +147,40 @@ TRAIN_DATA = 'train_data'
 VAL_DATA = 'val_data'
 TEST_DATA = 'test_data'
 
+
+def _obs_values(obs: List[Dict[str, Any]], column: str) -> np.ndarray:
+    # The values of a column across the observations, lists kept as objects
+    return pd.Series([ob.get(column) for ob in obs]).to_numpy()
+
+
+class BroadcastInputs(NamedTuple):
+    # Inputs of RecommenderModule.broadcast_recommendation_score for a batch of
+    # observations, with the number of (unpadded) arms of each one
+    context_inputs: Dict[str, np.ndarray]
+    arm_indices: np.ndarray
+    arm_inputs: Dict[str, np.ndarray]
+    counts: np.ndarray
+
+
+class RefreshHardNegatives(Callback):
+    # Refreshes the hard negatives of the training dataset at the start of the first
+    # epoch and of every interval-th one after it, in the main process, before the
+    # DataLoader workers copy it
+    def __init__(
+        self, dataset: Dataset, scorer: Callable, interval: int, batch_size: int
+    ) -> None:
+        super().__init__()
+        self._dataset = dataset
+        self._scorer = scorer
+        self._interval = interval
+        self._batch_size = batch_size
+
+    def on_start_epoch(self, state):
+        epoch = state[torchbearer.EPOCH]
+        if epoch % self._interval == 0:
+            self._dataset.refresh_hard_negatives(self._scorer, self._batch_size)
+
+
 class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     project: str = luigi.Parameter(
         description="Should be like config.trivago_contextual_bandit",
@@ -158,6 +214,22 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     load_index_mapping_path: str = luigi.Parameter(default=None)
 
     negative_proportion: int = luigi.FloatParameter(0.0)
+    dataset_backend: str = luigi.ChoiceParameter(
+        choices=DATASET_BACKENDS,
+        default="memory",
+        description="mmap writes the indexed datasets to disk once and reads their batches from there",
+    )
+    dataset_chunk_size: int = luigi.IntParameter(default=100000, significant=False)
+    use_data_frame_cache: bool = luigi.BoolParameter(
+        default=False,
+        significant=False,
+        description="Reuses the preprocessed and indexed data frames of other tasks with the same splits and index mapping",
+    )
+    data_frame_cache_max_size: float = luigi.FloatParameter(
+        default=20.0,
+        significant=False,
+        description="GB kept in the data frame cache, the least recently used frames are removed beyond it",
+    )
 
     @property
     def cache_attrs(self):
@@ -248,21 +320,21 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     @property
     def metadata_data_frame(self) -> Optional[pd.DataFrame]:
         if not hasattr(self, "_metadata_data_frame"):
-            self._metadata_data_frame = (
-                pd.read_csv(self.metadata_data_frame_path)
-                if self.metadata_data_frame_path
-                else None
-            )
-            if self._metadata_data_frame is not None:
-                literal_eval_array_columns(
-                    self._metadata_data_frame, self.project_config.metadata_columns
+            if self.metadata_data_frame_path:
+                self._metadata_data_frame = self._read_cached_indexed(
+                    (file_signature(self.metadata_data_frame_path), "metadata"),
+                    self._read_metadata_data_frame,
                 )
-            #
-            transform_with_indexing(
-                self._metadata_data_frame, self.index_mapping, self.project_config
-            )
+            else:
+                self._metadata_data_frame = None
         return self._metadata_data_frame
 
+    def _read_metadata_data_frame(self) -> pd.DataFrame:
+        data_frame = pd.read_csv(self.metadata_data_frame_path)
+        literal_eval_array_columns(data_frame, self.project_config.metadata_columns)
+        transform_with_indexing(data_frame, self.index_mapping, self.project_config)
+        return data_frame
+
     @property
     def embeddings_for_metadata(self) -> Optional[Dict[str, np.ndarray]]:
         if not hasattr(self, "_embeddings_for_metadata"):
@@ -282,17 +354,23 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
         columns        += [self.project_config.available_arms_column_name]
         return columns
 
+    @property
+    def dataset_read_dtypes(self) -> Dict[str, type]:
+        # The indexable columns are read as written, so that every chunk of a file
+        # gets the same keys no matter which values (like nan) it happens to hold
+        return {
+            column.name: str
+            for column in self.project_config.all_columns
+            if column.type == IOType.INDEXABLE
+            and column.name in self.dataset_read_columns
+        }
+
     @property
     def train_data_frame(self) -> pd.DataFrame:
         if not hasattr(self, "_train_data_frame"):
             print("train_data_frame:")
-            self._train_data_frame = preprocess_interactions_data_frame(
-                pd.read_csv(self.train_data_frame_path, 
-                    usecols = self.dataset_read_columns), self.project_config
-            )
-        
-            transform_with_indexing(
-                self._train_data_frame, self.index_mapping, self.project_config
+            self._train_data_frame = self._read_indexed_data_frame(
+                self.train_data_frame_path
             )
 
         return self._train_data_frame
@@ -301,13 +379,8 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     def val_data_frame(self) -> pd.DataFrame:
         if not hasattr(self, "_val_data_frame"):
             print("val_data_frame:")
-            self._val_data_frame = preprocess_interactions_data_frame(
-                pd.read_csv(self.val_data_frame_path, 
-                    usecols = self.dataset_read_columns), self.project_config
-            )
-
-            transform_with_indexing(
-                self._val_data_frame, self.index_mapping, self.project_config
+            self._val_data_frame = self._read_indexed_data_frame(
+                self.val_data_frame_path
             )
 
         return self._val_data_frame
@@ -316,28 +389,138 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     def test_data_frame(self) -> pd.DataFrame:
         if not hasattr(self, "_test_data_frame"):
             print("test_data_frame:")
-            self._test_data_frame = preprocess_interactions_data_frame(
-                pd.read_csv(self.test_data_frame_path, 
-                    usecols = self.dataset_read_columns), self.project_config
+            self._test_data_frame = self._read_indexed_data_frame(
+                self.test_data_frame_path
             )
 
-            transform_with_indexing(
-                self._test_data_frame, self.index_mapping, self.project_config
+        return self._test_data_frame
+
+    def _read_indexed_data_frame(self, data_frame_path: str) -> pd.DataFrame:
+        def read_data_frame() -> pd.DataFrame:
+            data_frame = preprocess_interactions_data_frame(
+                pd.read_csv(
+                    data_frame_path,
+                    usecols=self.dataset_read_columns,
+                    dtype=self.dataset_read_dtypes,
+                ),
+                self.project_config,
             )
+            transform_with_indexing(data_frame, self.index_mapping, self.project_config)
+            return data_frame
+
+        return self._read_cached_indexed(
+            (
+                file_signature(data_frame_path),
+                sorted(self.dataset_read_columns),
+                sorted(self.dataset_read_dtypes),
+            ),
+            read_data_frame,
+        )
 
-        return self._test_data_frame
+    def _read_cached_indexed(
+        self, key_parts: tuple, read_data_frame: Callable[[], pd.DataFrame]
+    ) -> pd.DataFrame:
+        # For data frames indexed by read_data_frame, identified by key_parts
+        if not self.use_data_frame_cache:
+            return read_data_frame()
+        key = hash_key(
+            *key_parts,
+            project_config_signature(self.project_config),
+            self.index_mapping_hash,
+        )
 
-    def get_data_frame_for_indexing(self) -> pd.DataFrame:
-        return pd.concat([pd.read_csv(self.train_data_frame_path, 
-                                usecols = self.dataset_read_columns), 
-                         pd.read_csv(self.val_data_frame_path, 
-                                usecols = self.dataset_read_columns)]).drop_duplicates()
+        def read_data_frame_and_new_keys() -> Tuple[pd.DataFrame, Dict[str, list]]:
+            # The unknown values are added to the index mapping (a defaultdict) while
+            # indexing, always at its end
+            sizes = {name: len(mapping) for name, mapping in self.index_mapping.items()}
+            data_frame = read_data_frame()
+            return (
+                data_frame,
+                {
+                    name: list(itertools.islice(mapping.items(), sizes[name], None))
+                    for name, mapping in self.index_mapping.items()
+                    if len(mapping) > sizes[name]
+                },
+            )
+
+        data_frame, new_keys = read_cached(
+            get_data_frame_cache_path(key),
+            read_data_frame_and_new_keys,
+            self.data_frame_cache_max_size_in_bytes,
+        )
+        # So the index mapping ends up the same as without the cache
+        for name, entries in new_keys.items():
+            self.index_mapping[name].update(entries)
+        return data_frame
+
+    @property
+    def data_frame_cache_max_size_in_bytes(self) -> int:
+        return int(self.data_frame_cache_max_size * 1024 ** 3)
+
+    @property
+    def index_mapping_hash(self) -> str:
+        if not hasattr(self, "_index_mapping_hash"):
+            self._index_mapping_hash = hash_key(self.index_mapping)
+        return self._index_mapping_hash
+
+    def _read_chunks(self, data_frame_path: str) -> Iterator[pd.DataFrame]:
+        return pd.read_csv(
+            data_frame_path,
+            usecols=self.dataset_read_columns,
+            dtype=self.dataset_read_dtypes,
+            chunksize=self.dataset_chunk_size,
+        )
+
+    def _read_indexed_chunks(
+        self, data_frame_path: str, index_available_arms: bool = True
+    ) -> Iterator[pd.DataFrame]:
+        item_mapping = self.index_mapping[self.project_config.item_column.name]
+        for chunk in self._read_chunks(data_frame_path):
+            chunk = preprocess_interactions_data_frame(chunk, self.project_config)
+            transform_with_indexing(chunk, self.index_mapping, self.project_config)
+            if (
+                index_available_arms
+                and self.project_config.available_arms_column_name in chunk
+            ):
+                chunk[self.project_config.available_arms_column_name] = chunk[
+                    self.project_config.available_arms_column_name
+                ].map(functools.partial(map_array, mapping=item_mapping))
+            yield chunk
+
+    def get_memory_mapped_columns(
+        self, data_key: str, data_frame_path: str
+    ) -> MemoryMappedColumns:
+        path = os.path.join(self.output().path, "datasets", data_key)
+        if memory_mapped_columns_exist(path):
+            return MemoryMappedColumns(path)
+
+        print("Writing the {} columns to {}...".format(data_key, path))
+        column_types = {
+            column.name: column.type
+            for column in self.project_config.input_columns
+            + [self.project_config.output_column]
+            + self.project_config.auxiliar_output_columns
+        }
+        if self.project_config.available_arms_column_name:
+            column_types[self.project_config.available_arms_column_name] = (
+                IOType.INDEXABLE_ARRAY
+            )
+        return write_memory_mapped_columns(
+            self._read_indexed_chunks(data_frame_path), column_types, path
+        )
+
+    def get_data_frames_for_indexing(self) -> Iterator[pd.DataFrame]:
+        # Only the unique values are kept, so the files are read in chunks
+        yield from self._read_chunks(self.train_data_frame_path)
+        yield from self._read_chunks(self.val_data_frame_path)
 
     def get_data_frame_interactions(self) ->  pd.DataFrame:
         return pd.concat([pd.read_csv(self.train_data_frame_path, 
-                                usecols = self.dataset_read_columns), 
+                                usecols = self.dataset_read_columns,
+                                dtype = self.dataset_read_dtypes), 
                          pd.read_csv(self.val_data_frame_path, 
-                                usecols = self.dataset_read_columns)]).drop_duplicates()
+                                usecols = self.dataset_read_columns,
+                                dtype = self.dataset_read_dtypes)]).drop_duplicates()
 
     @property
     def index_mapping_path(self) -> Optional[str]:
@@ -349,43 +532,42 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     def index_mapping(self) -> Dict[str, Dict[Any, int]]:
         if not hasattr(self, "_index_mapping"):
             print("index_mapping...")
-            
-            self._creating_index_mapping = True
-            df = preprocess_interactions_data_frame(
-                    self.get_data_frame_for_indexing(), self.project_config
-                )
 
+            # The indexing data is only read for the columns the mapping lacks
             if os.path.exists(self.index_mapping_path):
                 with open(self.index_mapping_path, "rb") as f:
                     self._index_mapping = pickle.load(f)
-                #del self._creating_index_mapping
             else:
                 self._index_mapping = {}
 
             keys_in_map = list(self._index_mapping.keys())
             project_all_columns = [c for c in self.project_config.all_columns if c.name not in keys_in_map]
+            columns_to_index = [
+                column
+                for column in project_all_columns
+                if column.type in (IOType.INDEXABLE, IOType.INDEXABLE_ARRAY)
+                and not column.same_index_as
+            ]
 
-            print("indexing project_all_columns...")
-            for column in project_all_columns:
-                if column.type == IOType.INDEXABLE and not column.same_index_as:
-                    self._index_mapping[column.name] = create_index_mapping(df[column.name].values)
-
-            # self._index_mapping = {
-            #     column.name: create_index_mapping(df[column.name].values)
-            #     for column in project_all_columns
-            #     if column.type == IOType.INDEXABLE and not column.same_index_as
-            # }
-            print("indexing create_index_mapping_from_arrays...")
-            self._index_mapping.update(
-                {
-                    column.name: create_index_mapping_from_arrays(
-                        df[column.name].values
+            if columns_to_index:
+                if self.use_data_frame_cache:
+                    key = hash_key(
+                        "index_mapping",
+                        self.get_data_frame_for_indexing_signature(),
+                        project_config_signature(self.project_config),
+                        [column.name for column in columns_to_index],
+                    )
+                    self._index_mapping.update(
+                        read_cached(
+                            get_data_frame_cache_path(key),
+                            functools.partial(self._create_index_mapping, columns_to_index),
+                            self.data_frame_cache_max_size_in_bytes,
+                        )
+                    )
+                else:
+                    self._index_mapping.update(
+                        self._create_index_mapping(columns_to_index)
                     )
-                    for column in project_all_columns
-                    if column.type == IOType.INDEXABLE_ARRAY
-                    and not column.same_index_as
-                }
-            )
 
             print("indexing same_index_as...")
             for column in project_all_columns:
@@ -394,61 +576,102 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
                         column.same_index_as
                     ]
 
-            del self._creating_index_mapping
-            del df
-
             with open(get_index_mapping_path(self.output().path), "wb") as f:
                 pickle.dump(self._index_mapping, f)
                 
         return self._index_mapping
 
+    def _create_index_mapping(self, columns: List[Column]) -> Dict[str, Dict[Any, int]]:
+        self._creating_index_mapping = True
+        print("indexing project_all_columns...")
+        values: Dict[str, set] = {column.name: set() for column in columns}
+        for df in self.get_data_frames_for_indexing():
+            df = preprocess_interactions_data_frame(df, self.project_config)
+            for column in columns:
+                if column.type == IOType.INDEXABLE:
+                    values[column.name].update(df[column.name].values)
+                else:
+                    values[column.name].update(
+                        str(value) for array in df[column.name].values for value in array
+                    )
+        del self._creating_index_mapping
+
+        return {
+            column.name: create_index_mapping(values[column.name]) for column in columns
+        }
+
+    def get_data_frame_for_indexing_signature(self) -> tuple:
+        # Identifies the data of get_data_frames_for_indexing, for the cache
+        return (
+            file_signature(self.train_data_frame_path),
+            file_signature(self.val_data_frame_path),
+            sorted(self.dataset_read_columns),
+            sorted(self.dataset_read_dtypes),
+        )
+
     @property
-    def reverse_index_mapping(self) -> Dict[str, Dict[int, Any]]:
-        rev = {
-            key: {value_: key_ for key_, value_ in mapping.items()}
+    def reverse_index_mapping(self) -> Dict[str, np.ndarray]:
+        # Rebuilt only when index_mapping changes (a mapping is replaced or gets new keys)
+        signature = tuple(
+            (key, id(mapping), len(mapping))
             for key, mapping in self.index_mapping.items()
-        }
-        # add nothing 0
-        for key, mapping in self.index_mapping.items():
-            rev[key][0] = 0 
-        return rev
+        )
+        if getattr(self, "_reverse_index_mapping_signature", None) != signature:
+            self._reverse_index_mapping = {
+                key: create_reverse_index_mapping(mapping)
+                for key, mapping in self.index_mapping.items()
+            }
+            self._reverse_index_mapping_signature = signature
+        return self._reverse_index_mapping
 
     @property
     def train_dataset(self) -> Dataset:
         if not hasattr(self, "_train_dataset"):
-            self._train_dataset = self.project_config.dataset_class(
-                data_frame=self.train_data_frame,
-                embeddings_for_metadata=self.embeddings_for_metadata,
-                project_config=self.project_config,
-                index_mapping=self.index_mapping,
-                negative_proportion=self.negative_proportion,
-                data_key=TRAIN_DATA
+            self._train_dataset = self._create_dataset(
+                self.train_data_frame
+                if self.dataset_backend == "memory"
+                else self.get_memory_mapped_columns(TRAIN_DATA, self.train_data_frame_path),
+                TRAIN_DATA,
             )
         return self._train_dataset
 
     @property
     def val_dataset(self) -> Dataset:
         if not hasattr(self, "_val_dataset"):
-            self._val_dataset = self.project_config.dataset_class(
-                data_frame=self.val_data_frame,
-                embeddings_for_metadata=self.embeddings_for_metadata,
-                project_config=self.project_config,
-                index_mapping=self.index_mapping,
-                negative_proportion=self.negative_proportion,
-                data_key=VAL_DATA
+            self._val_dataset = self._create_dataset(
+                self.val_data_frame
+                if self.dataset_backend == "memory"
+                else self.get_memory_mapped_columns(VAL_DATA, self.val_data_frame_path),
+                VAL_DATA,
             )
         return self._val_dataset
 
+    def _create_dataset(
+        self, data_frame: Union[pd.DataFrame, MemoryMappedColumns], data_key: str
+    ) -> Dataset:
+        return self.project_config.dataset_class(
+            data_frame=data_frame,
+            embeddings_for_metadata=self.embeddings_for_metadata,
+            project_config=self.project_config,
+            index_mapping=self.index_mapping,
+            negative_proportion=self.negative_proportion,
+            data_key=data_key,
+            **self.project_config.dataset_extra_params
+        )
+
     @property
     def test_dataset(self) -> Dataset:
         if not hasattr(self, "_test_dataset"):
             self._test_dataset = self.project_config.dataset_class(
-                data_frame=self.test_data_frame,
+                data_frame=self.test_data_frame
+                if self.dataset_backend == "memory"
+                else self.get_memory_mapped_columns(TEST_DATA, self.test_data_frame_path),
                 embeddings_for_metadata=self.embeddings_for_metadata,
                 project_config=self.project_config,
                 index_mapping=self.index_mapping,
                 negative_proportion=0.0,
-                data_key=TEST_DATA
+                data_key=TEST_DATA,
+                **self.project_config.dataset_extra_params
             )
         return self._test_dataset
 
@@ -596,8 +819,9 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         val_loader = self.get_val_generator()
         module = self.create_module()
 
-        print("train_data_frame:")
-        print(self.train_data_frame.describe())
+        if self.dataset_backend == "memory":
+            print("train_data_frame:")
+            print(self.train_data_frame.describe())
         
         summary_path = os.path.join(self.output().path, "summary.txt")
         with open(summary_path, "w") as summary_file:
@@ -606,8 +830,9 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
                 summary(module, sample_input)
             summary(module, sample_input)
 
-        sample_data = self.train_data_frame.sample(100, replace=True)
-        sample_data.to_csv(os.path.join(self.output().path, "sample_train.csv"))
+        if self.dataset_backend == "memory":
+            sample_data = self.train_data_frame.sample(100, replace=True)
+            sample_data.to_csv(os.path.join(self.output().path, "sample_train.csv"))
         
         trial = self.create_trial(module)
 
@@ -628,6 +853,22 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         self.evaluate()
         self.cache_cleanup()
 
+    def _get_dataset_scorer(self, module: nn.Module) -> Callable:
+        def scorer(inputs: Tuple[np.ndarray, ...]) -> np.ndarray:
+            was_training = module.training
+            module.eval()
+            try:
+                with torch.no_grad():
+                    input_params = [
+                        t.to(self.torch_device) for t in default_convert(inputs)
+                    ]
+                    scores = module.recommendation_score(*input_params)
+            finally:
+                module.train(was_training)
+            return scores.cpu().numpy().reshape(-1)
+
+        return scorer
+
     def get_sample_batch(self):
         return default_convert(self.train_dataset[0][0])
 
@@ -668,11 +909,24 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
 
     def create_trial(self, module: nn.Module) -> Trial:
         loss_function = self._get_loss_function()
+        callbacks = self._get_callbacks()
+        refresh_interval = getattr(
+            self.train_dataset, "hard_negatives_refresh_interval", None
+        )
+        if refresh_interval:
+            callbacks.append(
+                RefreshHardNegatives(
+                    self.train_dataset,
+                    self._get_dataset_scorer(module),
+                    refresh_interval,
+                    self.batch_size,
+                )
+            )
         trial = Trial(
             module,
             self._get_optimizer(module),
             loss_function,
-            callbacks=self._get_callbacks(),
+            callbacks=callbacks,
             metrics=self.metrics,
         ).to(self.torch_device)
         if hasattr(loss_function, "torchbearer_state"):
@@ -746,7 +1000,7 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         )
 
     def get_val_generator(self) -> Optional[DataLoader]:
-        if len(self.val_data_frame) == 0:
+        if len(self.val_dataset) == 0:
             return None
         batch_sampler = FasterBatchSampler(
             self.val_dataset, self.batch_size, shuffle=False
@@ -776,6 +1030,20 @@ class SupervisedModelTraining(TorchModelTraining):
         description="Should be like mars_gym.model.bandit.EpsilonGreedy",
     )
     bandit_policy_params: Dict[str, Any] = luigi.DictParameter(default={})
+    arm_sampling: str = luigi.ChoiceParameter(
+        choices=ARM_SAMPLING_STRATEGIES,
+        default="uniform",
+        description="How the candidate arms are drawn when there is no available arms column",
+    )
+    n_sampled_arms: int = luigi.IntParameter(default=100)
+    test_set_predictions_format: str = luigi.ChoiceParameter(
+        choices=PREDICTIONS_FORMATS, default="csv"
+    )
+    context_broadcasting: bool = luigi.BoolParameter(
+        default=False,
+        description="Score the arms with the context given once per observation, "
+        "when the reward model supports it and the policy does not read the arm contexts",
+    )
 
     def create_agent(self) -> BanditAgent:
         bandit_class = load_attr(self.bandit_policy_class, Type[BanditPolicy])
@@ -788,7 +1056,7 @@ class SupervisedModelTraining(TorchModelTraining):
     def unique_items(self) -> List[int]:
         if not hasattr(self, "_unique_items"):
             # self.index_mapping
-            # self._unique_items = self.get_data_frame_for_indexing()[
+            # self._unique_items = self.get_data_frames_for_indexing()[
             #     self.project_config.item_column.name
             # ].unique()
             self._unique_items = list(self.index_mapping[self.project_config.item_column.name].keys())[1:-1]
@@ -803,23 +1071,60 @@ class SupervisedModelTraining(TorchModelTraining):
             ]
         return self._obs_columns
 
+    def get_data_frame_for_arm_popularity(self) -> pd.DataFrame:
+        return self.train_data_frame
+
+    @property
+    def arm_sampler(self) -> ArmSampler:
+        if not hasattr(self, "_arm_sampler"):
+            item_column = self.project_config.item_column.name
+            items = np.array(
+                map_array(self.unique_items, self.index_mapping[item_column]),
+                dtype=np.int64,
+            )
+            weights = None
+            if self.arm_sampling == "popularity":
+                weights = np.bincount(
+                    self.get_data_frame_for_arm_popularity()[item_column].values,
+                    minlength=items.max(initial=0) + 1,
+                )[items]
+            self._arm_sampler = ArmSampler(
+                items, weights, seed=getattr(self, "_arm_sampler_seed", self.seed)
+            )
+        return self._arm_sampler
+
     def _get_arms(self, ob: dict) -> List[Any]:
-        #from IPython import embed; embed()
+        return self._get_arms_batch([ob])[0]
 
+    def _get_arms_batch(self, obs: List[dict]) -> List[List[Any]]:
         if self.project_config.available_arms_column_name:
-            arms = ob[self.project_config.available_arms_column_name]
-            arms = random.sample(arms, len(arms))
-        else: # Only Supervised Mode
-            #raise("available_arms_column_name not exist")
-            if ob[self.project_config.item_column.name] in self.reverse_index_mapping[self.project_config.item_column.name]:
-                ob_item = self.reverse_index_mapping[self.project_config.item_column.name][ob[self.project_config.item_column.name]]
-                arms = random.sample(self.unique_items, min(101, len(self.unique_items)))
-                arms.append(ob_item)
-                arms = list(np.unique(arms))
-            else:
-                arms = random.sample(self.unique_items, min(100, len(self.unique_items)))
+            return [
+                random.sample(
+                    ob[self.project_config.available_arms_column_name],
+                    len(ob[self.project_config.available_arms_column_name]),
+                )
+                for ob in obs
+            ]
 
-        return arms
+        # Only Supervised Mode: the negatives of every observation are drawn at once,
+        # and the true item is added when it is known
+        reverse_item_mapping = self.reverse_index_mapping[
+            self.project_config.item_column.name
+        ]
+        true_items = np.array(
+            [ob[self.project_config.item_column.name] for ob in obs], dtype=np.int64
+        )
+        known = (0 <= true_items) & (true_items < len(reverse_item_mapping))
+        negatives = self.arm_sampler.sample(
+            len(obs), self.n_sampled_arms, exclude=np.where(known, true_items, -1)
+        )
+
+        arms_list = []
+        for arm_indices, true_item, is_known in zip(negatives, true_items, known):
+            if is_known:
+                arm_indices = np.sort(np.append(arm_indices, true_item))
+            arms_list.append(list(reverse_item_mapping[arm_indices]))
+        return arms_list
 
     def _get_arm_scores(self, agent: BanditAgent, ob_dataset: Dataset) -> List[float]:
         batch_sampler = FasterBatchSampler(ob_dataset, self.batch_size, shuffle=False)
@@ -864,30 +1169,68 @@ class SupervisedModelTraining(TorchModelTraining):
         plt.close(figure)
 
     def _create_ob_data_frame(self, ob: dict, arm_indices: List[int]) -> pd.DataFrame:
-        data = [
-            {**ob, self.project_config.item_column.name: arm_index}
-            for arm_index in arm_indices
-        ]
-        ob_df = pd.DataFrame(
-            columns=self.obs_columns + [self.project_config.item_column.name], data=data
+        return self._create_obs_data_frame([ob], [arm_indices])
+
+    def _create_obs_data_frame(
+        self, obs: List[dict], arm_indices_list: List[List[int]]
+    ) -> pd.DataFrame:
+        # For the callers that need a DataFrame, InteractionsDataset reads the columns
+        return self._create_obs_columns(obs, arm_indices_list).to_data_frame()
+
+    def _create_obs_columns(
+        self, obs: List[dict], arm_indices_list: List[List[int]]
+    ) -> ArrayColumns:
+        # One row per (observation, arm): the observation values are repeated once
+        # per arm of that observation
+        counts = np.array([len(arm_indices) for arm_indices in arm_indices_list])
+        columns = {
+            column: np.repeat(_obs_values(obs, column), counts)
+            for column in self.obs_columns
+        }
+        columns[self.project_config.item_column.name] = np.concatenate(
+            [np.asarray(arm_indices, dtype=np.int64) for arm_indices in arm_indices_list]
+            or [np.zeros(0, dtype=np.int64)]
         )
 
-        ob_df = self._fill_hist_columns(ob_df)
+        columns = self._fill_hist_columns(columns)
+        self._fill_output_columns(columns, counts.sum())
 
-        if self.project_config.output_column.name not in ob_df.columns:
-            ob_df[self.project_config.output_column.name] = 1
+        return ArrayColumns(columns, counts.sum())
+
+    def _fill_output_columns(self, columns: Dict[str, np.ndarray], n_rows: int) -> None:
+        if self.project_config.output_column.name not in columns:
+            columns[self.project_config.output_column.name] = np.ones(
+                n_rows, dtype=np.int64
+            )
         for auxiliar_output_column in self.project_config.auxiliar_output_columns:
-            if auxiliar_output_column.name not in ob_df.columns:
-                ob_df[auxiliar_output_column.name] = 0
+            if auxiliar_output_column.name not in columns:
+                columns[auxiliar_output_column.name] = np.zeros(n_rows, dtype=np.int64)
 
-        return ob_df
+    @property
+    def hist_counter(self) -> PairCounter:
+        if not hasattr(self, "_hist_counter"):
+            self._hist_counter = PairCounter(self.n_items, n_counters=2)
+        return self._hist_counter
+
+    def _fill_hist_columns(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        hist_counts = self.hist_counter.gather(
+            np.asarray(columns[self.project_config.user_column.name]),
+            np.asarray(columns[self.project_config.item_column.name]),
+        )
+        if self.project_config.hist_view_column_name not in columns:
+            columns[self.project_config.hist_view_column_name] = hist_counts[:, 0]
+        if self.project_config.hist_output_column_name not in columns:
+            columns[self.project_config.hist_output_column_name] = hist_counts[:, 1]
+        return columns
 
-    def _fill_hist_columns(self, ob_df: pd.DataFrame) -> pd.DataFrame:
-        if self.project_config.hist_view_column_name not in ob_df:
-            ob_df[self.project_config.hist_view_column_name] = 0
-        if self.project_config.hist_output_column_name not in ob_df:
-            ob_df[self.project_config.hist_output_column_name] = 0
-        return ob_df
+    def _uses_context_broadcasting(self, agent: BanditAgent) -> bool:
+        reward_model = agent.bandit.reward_model
+        return (
+            self.context_broadcasting
+            and reward_model is not None
+            and getattr(reward_model, "supports_context_broadcasting", False)
+            and not agent.bandit.uses_arm_contexts
+        )
 
     def _prepare_for_agent(
         self, agent: BanditAgent, obs: List[Dict[str, Any]]
@@ -897,7 +1240,32 @@ class SupervisedModelTraining(TorchModelTraining):
         List[List[int]],
         List[List[float]],
     ]:
-        arms_list = [self._get_arms(ob) for ob in obs]
+        (
+            arm_contexts_list,
+            arms_list,
+            arm_indices_list,
+            obs_dataset,
+        ) = self._prepare_candidates(
+            obs, broadcast=self._uses_context_broadcasting(agent)
+        )
+        arm_scores_list = self._score_candidates(
+            agent, obs_dataset, arm_contexts_list, arm_indices_list
+        )
+        return arm_contexts_list, arms_list, arm_indices_list, arm_scores_list
+
+    def _prepare_candidates(
+        self,
+        obs: List[Dict[str, Any]],
+        arms_list: Optional[List[List[Any]]] = None,
+        broadcast: bool = False,
+    ) -> Tuple[
+        List[Optional[Tuple[np.ndarray, ...]]],
+        List[List[Any]],
+        List[List[int]],
+        Union[Dataset, BroadcastInputs],
+    ]:
+        if arms_list is None:
+            arms_list = self._get_arms_batch(obs)
 
         # TODO
         # If a column in available_arms_column_name was used in (auxiliar_output_columns, other_input_columns) its not necessery
@@ -913,38 +1281,167 @@ class SupervisedModelTraining(TorchModelTraining):
             ]
         else:
             arm_indices_list = cast(List[List[int]], arms_list)
-        # from IPython import embed; embed()
-        # print("A")
-        # ob_dfs = []
-        # for ob, arm_indices in tqdm(zip(obs, arm_indices_list), total=len(obs)):
-        #     ob_dfs.append(self._create_ob_data_frame(ob, arm_indices))
-        # print("B")
-        ob_dfs = [
-            self._create_ob_data_frame(ob, arm_indices)
-            for ob, arm_indices in zip(obs, arm_indices_list)
-        ]
-        
+
+        if broadcast:
+            # No arm contexts: the policy only reads the scores
+            return (
+                [None] * len(obs),
+                arms_list,
+                arm_indices_list,
+                self._create_broadcast_inputs(obs, arm_indices_list),
+            )
 
         obs_dataset = InteractionsDataset(
-            pd.concat(ob_dfs),
+            self._create_obs_columns(obs, arm_indices_list),
             obs[0][ITEM_METADATA_KEY],
             self.project_config,
             self.index_mapping,
         )
 
-        arm_contexts_list: List[Tuple[np.ndarray, ...]] = []
-        i = 0
-        for ob_df in ob_dfs:
-            arm_contexts_list.append(obs_dataset[i : i + len(ob_df)][0])
-            i += len(ob_df)
+        # The inputs are converted once and then split per observation
+        all_arm_contexts = obs_dataset[0 : len(obs_dataset)][0]
+        offsets = np.cumsum([0] + [len(arm_indices) for arm_indices in arm_indices_list])
+        arm_contexts_list: List[Tuple[np.ndarray, ...]] = [
+            tuple(arm_context[start:end] for arm_context in all_arm_contexts)
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+        return arm_contexts_list, arms_list, arm_indices_list, obs_dataset
 
-        if agent.bandit.reward_model:
+    def _create_broadcast_inputs(
+        self, obs: List[Dict[str, Any]], arm_indices_list: List[List[int]]
+    ) -> BroadcastInputs:
+        user_column = self.project_config.user_column.name
+        item_column = self.project_config.item_column.name
+        hist_columns = [
+            self.project_config.hist_view_column_name,
+            self.project_config.hist_output_column_name,
+        ]
+        metadata_columns = [column.name for column in self.project_config.metadata_columns]
+
+        # The (observation, arm) pairs are padded to a (batch, max arms) matrix
+        counts = np.array([len(arm_indices) for arm_indices in arm_indices_list])
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        rows = np.repeat(np.arange(len(obs)), counts)
+        positions = np.arange(offsets[-1]) - np.repeat(offsets[:-1], counts)
+        arm_indices = np.zeros((len(obs), counts.max(initial=0)), dtype=np.int64)
+        arm_indices[rows, positions] = np.concatenate(
+            [np.asarray(arm_indices, dtype=np.int64) for arm_indices in arm_indices_list]
+            or [np.zeros(0, dtype=np.int64)]
+        )
+
+        # One row per observation for the context columns
+        context_columns = {
+            column: _obs_values(obs, column)
+            for column in self.obs_columns
+            if column not in hist_columns + metadata_columns
+        }
+        self._fill_output_columns(context_columns, len(obs))
+        context_dataset = InteractionsDataset(
+            ArrayColumns(context_columns, len(obs)),
+            None,
+            self.project_config,
+            self.index_mapping,
+        )
+        context_values = context_dataset[0 : len(context_dataset)][0] if len(obs) else ()
+        context_inputs = dict(
+            zip(
+                [
+                    column.name
+                    for column in self.project_config.input_columns
+                    if column.name in context_columns
+                ],
+                context_values,
+            )
+        )
+
+        # The hist columns depend on the arm, so they are filled for every pair
+        pair_columns = self._fill_hist_columns(
+            {
+                user_column: context_columns[user_column][rows],
+                item_column: arm_indices[rows, positions],
+                **{
+                    column: np.repeat(_obs_values(obs, column), counts)
+                    for column in hist_columns
+                    if column in self.obs_columns
+                },
+            }
+        )
+
+        arm_inputs = {}
+        for column in self.project_config.input_columns:
+            if column.name in hist_columns:
+                values = np.zeros(
+                    arm_indices.shape,
+                    dtype=np.float64 if column.type == IOType.NUMBER else np.int64,
+                )
+                values[rows, positions] = pair_columns[column.name]
+                arm_inputs[column.name] = values
+            elif (
+                column.name in metadata_columns
+                and self.embeddings_for_metadata is not None
+            ):
+                arm_inputs[column.name] = self.embeddings_for_metadata[column.name][
+                    arm_indices
+                ]
+
+        return BroadcastInputs(context_inputs, arm_indices, arm_inputs, counts)
+
+    def _get_broadcast_arm_scores(
+        self, agent: BanditAgent, inputs: BroadcastInputs
+    ) -> List[List[float]]:
+        model = agent.bandit.reward_model
+        model.to(self.torch_device)
+        model.eval()
+
+        # As many observations per batch as fit batch_size (observation, arm) pairs
+        n_obs = len(inputs.counts)
+        obs_per_batch = max(1, self.batch_size // max(1, inputs.arm_indices.shape[1]))
+
+        def to_tensor(values: np.ndarray, batch: slice) -> torch.Tensor:
+            return default_convert(np.ascontiguousarray(values[batch])).to(
+                self.torch_device
+            )
+
+        arm_scores_list = []
+        with torch.no_grad():
+            for start in range(0, n_obs, obs_per_batch):
+                batch = slice(start, start + obs_per_batch)
+                scores = model.broadcast_recommendation_score(
+                    {
+                        name: to_tensor(values, batch)
+                        for name, values in inputs.context_inputs.items()
+                    },
+                    to_tensor(inputs.arm_indices, batch),
+                    {
+                        name: to_tensor(values, batch)
+                        for name, values in inputs.arm_inputs.items()
+                    },
+                )
+                scores = scores.cpu().numpy()
+                arm_scores_list.extend(
+                    scores[i, :count].tolist()
+                    for i, count in enumerate(inputs.counts[batch])
+                )
+
+        return arm_scores_list
+
+    def _score_candidates(
+        self,
+        agent: BanditAgent,
+        obs_dataset: Union[Dataset, BroadcastInputs],
+        arm_contexts_list: List[Optional[Tuple[np.ndarray, ...]]],
+        arm_indices_list: List[List[int]],
+    ) -> List[List[float]]:
+        if isinstance(obs_dataset, BroadcastInputs):
+            arm_scores_list = self._get_broadcast_arm_scores(agent, obs_dataset)
+        elif agent.bandit.reward_model:
             all_arm_scores = self._get_arm_scores(agent, obs_dataset)
             arm_scores_list = []
             i = 0
-            for ob_df in ob_dfs:
-                arm_scores_list.append(all_arm_scores[i : i + len(ob_df)])
-                i += len(ob_df)
+            for arm_indices in arm_indices_list:
+                arm_scores_list.append(all_arm_scores[i : i + len(arm_indices)])
+                i += len(arm_indices)
         else:
             arm_scores_list = [
                 agent.bandit.calculate_scores(arm_indices, arm_contexts)
@@ -953,17 +1450,43 @@ class SupervisedModelTraining(TorchModelTraining):
                 )
             ]
         #print("C")
-        return arm_contexts_list, arms_list, arm_indices_list, arm_scores_list
+        return arm_scores_list
+
+    def _act(self, agent: BanditAgent, ob: dict) -> Tuple[int, float]:
+        actions, probs = self._act_batch(agent, [ob])
+        return actions[0], probs[0]
 
-    def _act(self, agent: BanditAgent, ob: dict) -> int:
+    def _act_batch(
+        self, agent: BanditAgent, obs: List[Dict[str, Any]]
+    ) -> Tuple[List[int], List[float]]:
+        # All the observations are scored together, then the agent acts on each one in order
         (
             arm_contexts_list,
             _,
             arm_indices_list,
             arm_scores_list,
-        ) = self._prepare_for_agent(agent, [ob])
+        ) = self._prepare_for_agent(agent, obs)
 
-        return agent.act(arm_indices_list[0], arm_contexts_list[0], arm_scores_list[0])
+        return self._select_actions(
+            agent, arm_contexts_list, arm_indices_list, arm_scores_list
+        )
+
+    def _select_actions(
+        self,
+        agent: BanditAgent,
+        arm_contexts_list: List[Tuple[np.ndarray, ...]],
+        arm_indices_list: List[List[int]],
+        arm_scores_list: List[List[float]],
+    ) -> Tuple[List[int], List[float]]:
+        actions, probs = [], []
+        for arm_indices, arm_contexts, arm_scores in zip(
+            arm_indices_list, arm_contexts_list, arm_scores_list
+        ):
+            action, prob = agent.act(arm_indices, arm_contexts, arm_scores)
+            actions.append(action)
+            probs.append(prob)
+
+        return actions, probs
 
     # def clean(self):
     #     if hasattr(self, "_train_dataset"):
@@ -982,68 +1505,136 @@ class SupervisedModelTraining(TorchModelTraining):
 
     def _save_test_set_predictions(self, agent: BanditAgent) -> None:
         print("Saving test set predictions...")
+
+        # The test set is predicted chunk by chunk, next to its rows as written
+        positions = self._get_test_set_sample_positions()
+        sorted_positions = np.sort(positions) if positions is not None else None
+        dfs: List[pd.DataFrame] = []
+        scores: List[float] = []
+        start = 0
+        for df, indexed_df in tqdm(
+            zip(
+                pd.read_csv(
+                    self.test_data_frame_path,
+                    dtype=self.dataset_read_dtypes,
+                    chunksize=self.dataset_chunk_size,
+                ),
+                self._read_indexed_chunks(
+                    self.test_data_frame_path, index_available_arms=False
+                ),
+            )
+        ):
+            if sorted_positions is not None:
+                rows = (
+                    sorted_positions[
+                        (sorted_positions >= start)
+                        & (sorted_positions < start + len(df))
+                    ]
+                    - start
+                )
+                start += len(df)
+                df, indexed_df = df.iloc[rows], indexed_df.iloc[rows]
+            if len(df) == 0:
+                continue
+
+            (
+                sorted_actions_list,
+                proba_actions_list,
+                arm_scores_list,
+            ) = self._predict_test_set(agent, indexed_df.to_dict("records"))
+            dfs.append(
+                df.assign(
+                    sorted_actions=sorted_actions_list,
+                    prob_actions=proba_actions_list,
+                    action_scores=[
+                        list(reversed(sorted(action_scores)))
+                        for action_scores in arm_scores_list
+                    ],
+                )
+            )
+            scores.extend(score for arm_scores in arm_scores_list for score in arm_scores)
+
+        # Create evaluation file
+        df = pd.concat(dfs)
+        if positions is not None:
+            # In the order of the sample
+            df = df.iloc[np.searchsorted(sorted_positions, positions)]
+
+        # join with train interaction information
+        df_train = self.get_data_frame_interactions()[[self.project_config.user_column.name, self.project_config.item_column.name]]
+        df_train['trained'] = 1
+        df = df.merge(df_train, on = [self.project_config.user_column.name, self.project_config.item_column.name], how='left')
+        df['trained'] =  df['trained'].fillna(0)
         
-        if self.sample_size_eval and len(self.test_data_frame) > self.sample_size_eval:
-            obs: List[Dict[str, Any]] = self.test_data_frame.sample(self.sample_size_eval, random_state=self.seed).to_dict("records")
+        # Add indexed information
+        df['item_indexed'] = df[self.project_config.item_column.name].apply(lambda i: self.index_mapping[self.project_config.item_column.name][str(i)] > 0)
+        
+        self.plot_scores(scores)
+
+        if self.test_set_predictions_format == "npy":
+            write_test_set_predictions(
+                df, get_test_set_predictions_path(self.output().path, "npy")
+            )
         else:
-            obs: List[Dict[str, Any]] = self.test_data_frame.to_dict("records")
+            self._to_csv_test_set_predictions(df)
+
+    def _get_test_set_sample_positions(self) -> Optional[np.ndarray]:
+        if not self.sample_size_eval:
+            return None
+        size = sum(
+            len(chunk)
+            for chunk in pd.read_csv(
+                self.test_data_frame_path,
+                usecols=[0],
+                chunksize=self.dataset_chunk_size,
+            )
+        )
+        if size <= self.sample_size_eval:
+            return None
+        # The same rows as DataFrame.sample(sample_size_eval, random_state=seed)
+        return np.random.RandomState(self.seed).choice(
+            size, self.sample_size_eval, replace=False
+        )
 
-        for ob in tqdm(obs, total=len(obs)):
+    def _predict_test_set(
+        self, agent: BanditAgent, obs: List[Dict[str, Any]]
+    ) -> Tuple[List[List[Any]], List[List[float]], List[List[float]]]:
+        for ob in obs:
             if self.embeddings_for_metadata is not None:
                 ob[ITEM_METADATA_KEY] = self.embeddings_for_metadata
             else:
                 ob[ITEM_METADATA_KEY] = None
 
-        print("...prepare_for_agent")
         (
             arm_contexts_list,
             arms_list,
             arm_indices_list,
             arm_scores_list,
         ) = self._prepare_for_agent(agent, obs)
-        print("...")
-        
+
         sorted_actions_list = []
         proba_actions_list  = []
 
-        for arm_contexts, arms, arm_indices, arm_scores in tqdm(
-            zip(arm_contexts_list, arms_list, arm_indices_list, arm_scores_list),
-            total=len(arm_contexts_list),
-        ):
-            sorted_actions, proba_actions = agent.rank(
-                arms, arm_indices, arm_contexts, arm_scores
+        if agent.bandit.uses_arm_contexts:
+            for arm_contexts, arms, arm_indices, arm_scores in zip(
+                arm_contexts_list, arms_list, arm_indices_list, arm_scores_list
+            ):
+                sorted_actions, proba_actions = agent.rank(
+                    arms, arm_indices, arm_contexts, arm_scores
+                )
+                sorted_actions_list.append(sorted_actions)
+                proba_actions_list.append(proba_actions)
+        else:
+            # Only the scores are needed, so every row is ranked at once
+            positions_list, proba_actions_list = agent.rank_batch(
+                arm_indices_list, arm_scores_list, arm_contexts_list
             )
-            sorted_actions_list.append(sorted_actions)
-            proba_actions_list.append(proba_actions)
-
-        action_scores_list = [
-            list(reversed(sorted(action_scores))) for action_scores in arm_scores_list
-        ]
-
-        del obs
-
-        # Create evaluation file
-        df = pd.read_csv(self.test_data_frame_path)
-        if self.sample_size_eval and len(self.test_data_frame) > self.sample_size_eval:
-            df = df.sample(self.sample_size_eval, random_state=self.seed)
-        
-        df["sorted_actions"] = sorted_actions_list
-        df["prob_actions"]   = proba_actions_list
-        df["action_scores"]  = action_scores_list
-        
-        # join with train interaction information
-        df_train = self.get_data_frame_interactions()[[self.project_config.user_column.name, self.project_config.item_column.name]]
-        df_train['trained'] = 1
-        df = df.merge(df_train, on = [self.project_config.user_column.name, self.project_config.item_column.name], how='left')
-        df['trained'] =  df['trained'].fillna(0)
-        
-        # Add indexed information
-        df['item_indexed'] = df[self.project_config.item_column.name].apply(lambda i: self.index_mapping[self.project_config.item_column.name][str(i)] > 0)
-        
-        scores = [score for arm_scores in arm_scores_list for score in arm_scores]
-        self.plot_scores(scores)
+            sorted_actions_list = [
+                [arms[position] for position in positions]
+                for arms, positions in zip(arms_list, positions_list)
+            ]
 
-        self._to_csv_test_set_predictions(df)
+        return sorted_actions_list, proba_actions_list, arm_scores_list
 
     def _to_csv_test_set_predictions(self, df: pd.DataFrame) -> None:
         df.to_csv(get_test_set_predictions_path(self.output().path), index=False)
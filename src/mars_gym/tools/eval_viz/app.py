@@ -7,6 +7,7 @@ import plotly.graph_objects as go
 import os
 from mars_gym.tools.eval_viz.plot import *
 from mars_gym.tools.eval_viz.util import *
+from mars_gym.simulation.logs import read_log
 import random
 import os
 
@@ -165,9 +166,11 @@ def load_iteractions_params(iteractions):
 # @st.cache(allow_output_mutation=True)
 def load_item_most_popular(model):
     random.seed(42)
-    file = os.path.join(fetch_iteraction_results_path()[model], "gt-datalog.csv")
+    file = os.path.join(fetch_iteraction_results_path()[model], "gt-datalog.parquet")
+    if not os.path.exists(file):
+        file = os.path.join(fetch_iteraction_results_path()[model], "gt-datalog.csv")
 
-    df = pd.read_csv(file, columns=["item_idx"])
+    df = read_log(file, columns=["item_idx"])
 
     return df
 
@@ -175,6 +178,16 @@ def load_item_most_popular(model):
 # @st.cache(allow_output_mutation=True)
 def load_data_iteractions_metrics(model, sample_size=10000):
     random.seed(42)
+    file = os.path.join(fetch_iteraction_results_path()[model], "sim-datalog.parquet")
+    if os.path.exists(file):
+        # Parquet logs are read whole and then sampled
+        df = read_log(file)
+        size = np.min([sample_size, len(df)])
+        idx = sorted(random.sample(range(len(df)), size))
+        df = df.iloc[idx].reset_index(drop=True)
+        df["idx"] = idx
+        return df
+
     file = os.path.join(fetch_iteraction_results_path()[model], "sim-datalog.csv")
 
     # Count the lines
@@ -37,21 +37,31 @@ def get_interaction_dir(model_cls: Type, task_id: str):
     )
 
 
-def get_simulator_datalog_path(task_dir: str) -> str:
-    return os.path.join(task_dir, "sim-datalog.csv")
+def get_simulator_datalog_path(task_dir: str, log_format: str = "csv") -> str:
+    return os.path.join(task_dir, "sim-datalog.{}".format(log_format))
 
 
-def get_interator_datalog_path(task_dir: str) -> str:
-    return os.path.join(task_dir, "all-datalog.csv")
+def get_interator_datalog_path(task_dir: str, log_format: str = "csv") -> str:
+    return os.path.join(task_dir, "all-datalog.{}".format(log_format))
 
 
-def get_ground_truth_datalog_path(task_dir: str) -> str:
-    return os.path.join(task_dir, "gt-datalog.csv")
+def get_ground_truth_datalog_path(task_dir: str, log_format: str = "csv") -> str:
+    return os.path.join(task_dir, "gt-datalog.{}".format(log_format))
 
 
-def get_test_set_predictions_path(task_dir: str) -> str:
-    return os.path.join(task_dir, "test_set_predictions.csv")
+def get_checkpoint_path(task_dir: str) -> str:
+    return os.path.join(task_dir, "checkpoint.pkl")
+
+
+def get_test_set_predictions_path(task_dir: str, predictions_format: str = "csv") -> str:
+    if predictions_format == "csv":
+        return os.path.join(task_dir, "test_set_predictions.csv")
+    return os.path.join(task_dir, "test_set_predictions")
 
 
 def get_index_mapping_path(task_dir: str) -> str:
     return os.path.join(task_dir, "index_mapping.pkl")
+
+
+def get_data_frame_cache_path(key: str) -> str:
+    return os.path.join(OUTPUT_PATH, "cache", "data_frames", "{}.pkl".format(key))
@@ -44,6 +44,16 @@ def create_index_mapping_from_arrays(
     return create_index_mapping(all_values, include_unkown, include_none)
 
 
+def create_reverse_index_mapping(mapping: Dict[Any, int]) -> np.ndarray:
+    # Dense index -> key array. When several keys share an index (None/nan, -1/"-1"),
+    # the last one inserted wins, like inverting the dict would.
+    reverse = np.empty(max(mapping.values(), default=0) + 1, dtype=object)
+    for key, index in mapping.items():
+        reverse[index] = key
+    reverse[0] = 0  # add nothing 0
+    return reverse
+
+
 def map_array(values: list, mapping: dict) -> List[int]:
     return [int(mapping[str(value)]) for value in values]
 
@@ -0,0 +1,120 @@
+import json
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import psutil
+
+PERCENTILES = [50, 90, 99]
+SUMMARY_COLUMNS = (
+    ["calls", "total_time", "mean_time"]
+    + ["p{}_time".format(percentile) for percentile in PERCENTILES]
+    + ["max_time", "peak_rss_mb"]
+)
+
+
+class PhaseProfiler(object):
+    """Wall time and resident memory of the named phases of a loop.
+
+    Every call of a phase records its duration and the RSS of the process at its
+    end. ``end_window`` closes the current window (e.g. the interactions between
+    two refits), summarizing the calls since the previous one.
+    """
+
+    def __init__(self, stream_path: Optional[str] = None) -> None:
+        self._stream_path = stream_path
+        self._durations: Dict[str, array] = {}
+        self._peak_rss: Dict[str, int] = {}
+        self._window_start: Dict[str, int] = {}
+        self._window_peak_rss: Dict[str, int] = {}
+        self._windows: List[dict] = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_process", None)
+        return state
+
+    @property
+    def process(self) -> psutil.Process:
+        if not hasattr(self, "_process"):
+            self._process = psutil.Process()
+        return self._process
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            rss = self.process.memory_info().rss
+
+            if name not in self._durations:
+                self._durations[name] = array("d")
+                self._peak_rss[name] = 0
+            self._durations[name].append(duration)
+            self._peak_rss[name] = max(self._peak_rss[name], rss)
+            self._window_peak_rss[name] = max(self._window_peak_rss.get(name, 0), rss)
+
+    def _summarize(self, durations: np.ndarray, peak_rss: int) -> dict:
+        summary = {
+            "calls": len(durations),
+            "total_time": float(durations.sum()),
+            "mean_time": float(durations.mean()),
+        }
+        for percentile, value in zip(
+            PERCENTILES, np.percentile(durations, PERCENTILES)
+        ):
+            summary["p{}_time".format(percentile)] = float(value)
+        summary["max_time"] = float(durations.max())
+        summary["peak_rss_mb"] = peak_rss / 2 ** 20
+        return summary
+
+    def end_window(self, window: int) -> None:
+        rows = []
+        for name, durations in self._durations.items():
+            start = self._window_start.get(name, 0)
+            if len(durations) == start:
+                continue
+            rows.append(
+                {
+                    "window": window,
+                    "phase": name,
+                    **self._summarize(
+                        np.frombuffer(durations, dtype=np.float64)[start:],
+                        self._window_peak_rss[name],
+                    ),
+                }
+            )
+            self._window_start[name] = len(durations)
+        self._window_peak_rss.clear()
+        self._windows.extend(rows)
+
+        if self._stream_path:
+            with open(self._stream_path, "a") as stream_file:
+                for row in rows:
+                    stream_file.write(json.dumps(row) + "\n")
+
+    def to_data_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [
+                {
+                    "phase": name,
+                    **self._summarize(
+                        np.frombuffer(durations, dtype=np.float64),
+                        self._peak_rss[name],
+                    ),
+                }
+                for name, durations in self._durations.items()
+                if len(durations) > 0
+            ],
+            columns=["phase"] + SUMMARY_COLUMNS,
+        )
+
+    def windows_data_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            self._windows, columns=["window", "phase"] + SUMMARY_COLUMNS
+        )
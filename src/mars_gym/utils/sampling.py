@@ -0,0 +1,114 @@
+from typing import Optional
+
+import numpy as np
+
+ARM_SAMPLING_STRATEGIES = ["uniform", "popularity"]
+
+
+class AliasTable(object):
+    """Walker's alias table: O(1) draws from a fixed discrete distribution."""
+
+    def __init__(self, weights: np.ndarray) -> None:
+        weights = np.asarray(weights, dtype=np.float64)
+        assert weights.ndim == 1 and len(weights) > 0 and (weights >= 0).all()
+        assert weights.sum() > 0
+
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        self._prob = np.ones(n, dtype=np.float64)
+        self._alias = np.arange(n, dtype=np.int64)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Whatever is left has probability 1 up to rounding errors
+
+    def __len__(self) -> int:
+        return len(self._prob)
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        columns = rng.integers(0, len(self._prob), size=size)
+        accept = rng.random(size=size) < self._prob[columns]
+        return np.where(accept, columns, self._alias[columns])
+
+
+class ArmSampler(object):
+    """Draws ``k`` distinct items per row for a whole batch of rows at once.
+
+    The items are drawn uniformly or proportionally to ``weights`` (through an
+    alias table), optionally excluding one item per row (e.g. the true item).
+    Every row is returned sorted.
+    """
+
+    def __init__(
+        self,
+        items: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self._items = np.asarray(items)
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+            # Items with no weight can never be drawn
+            self._items = self._items[weights > 0]
+            self._alias_table = AliasTable(weights[weights > 0])
+        else:
+            self._alias_table = None
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def items(self) -> np.ndarray:
+        return self._items
+
+    def _draw(self, size) -> np.ndarray:
+        if self._alias_table is None:
+            positions = self.rng.integers(0, len(self._items), size=size)
+        else:
+            positions = self._alias_table.sample(self.rng, size)
+        return self._items[positions]
+
+    def _first_distinct(
+        self, draws: np.ndarray, exclude: Optional[np.ndarray], k: int
+    ) -> np.ndarray:
+        # Keeps the first occurrence of each item in draw order, which is the same
+        # as drawing one item at a time without replacement
+        order = np.argsort(draws, axis=1, kind="stable")
+        sorted_draws = np.take_along_axis(draws, order, axis=1)
+        repeated = np.zeros(draws.shape, dtype=bool)
+        repeated[:, 1:] = sorted_draws[:, 1:] == sorted_draws[:, :-1]
+        valid = np.empty(draws.shape, dtype=bool)
+        np.put_along_axis(valid, order, ~repeated, axis=1)
+        if exclude is not None:
+            valid &= draws != exclude[:, None]
+        return valid & (np.cumsum(valid, axis=1) <= k)
+
+    def sample(
+        self, n_rows: int, k: int, exclude: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        k = min(k, len(self._items) - (1 if exclude is not None else 0))
+        if k <= 0:
+            return np.empty((n_rows, 0), dtype=self._items.dtype)
+
+        samples = np.empty((n_rows, k), dtype=self._items.dtype)
+        pending = np.arange(n_rows)
+        n_draws = 2 * k + 1
+        while len(pending) > 0:
+            draws = self._draw((len(pending), n_draws))
+            selected = self._first_distinct(
+                draws, exclude[pending] if exclude is not None else None, k
+            )
+            done = selected.sum(axis=1) == k
+            samples[pending[done]] = draws[done][selected[done]].reshape(-1, k)
+            # The rows without k distinct items are drawn again, with more draws
+            pending = pending[~done]
+            n_draws *= 2
+
+        return np.sort(samples, axis=1)
@@ -17,3 +17,16 @@ test_base_training = ProjectConfig(
     output_column=Column("reward", IOType.NUMBER),
     recommender_type=RecommenderType.USER_BASED_COLLABORATIVE_FILTERING,
 )
+
+test_base_training_with_auxiliar_output = ProjectConfig(
+    base_dir=os.path.join("tests", "output", "test"),
+    prepare_data_frames_task=UnitTestDataFrames,
+    dataset_class=InteractionsDataset,
+    user_column=Column("user", IOType.INDEXABLE),
+    item_column=Column("item", IOType.INDEXABLE),
+    other_input_columns=[],
+    metadata_columns=[],
+    output_column=Column("reward", IOType.NUMBER),
+    auxiliar_output_columns=[Column("ps", IOType.NUMBER)],
+    recommender_type=RecommenderType.USER_BASED_COLLABORATIVE_FILTERING,
+)
@@ -6,11 +6,14 @@ import unittest
 import luigi
 import torch.nn as nn
 from mars_gym.model.base_model import LogisticRegression
-from mars_gym.simulation.interaction import InteractionTraining
-from mars_gym.simulation.training import SupervisedModelTraining
+from mars_gym.simulation.interaction import InteractionTraining, SimulatedPolicy
+from mars_gym.simulation.training import RefreshHardNegatives, SupervisedModelTraining
 from mars_gym.evaluation.task import EvaluateTestSetPredictions
-from unittest.mock import patch
+from unittest.mock import Mock, patch
+import pickle
 import shutil
+import torchbearer
+from concurrent.futures import ThreadPoolExecutor
 
 
 class TestTraining(unittest.TestCase):
@@ -59,5 +62,75 @@ class TestTraining(unittest.TestCase):
         luigi.build([job], local_scheduler=True)
 
 
+class TestContextBroadcasting(unittest.TestCase):
+    def test_broadcast_inputs_with_auxiliar_output_columns(self):
+        job = SupervisedModelTraining(
+            project="tests.factories.config.test_base_training_with_auxiliar_output",
+            recommender_module_class="mars_gym.model.base_model.LogisticRegression",
+            recommender_extra_params={"n_factors": 10},
+            context_broadcasting=True,
+        )
+        job._index_mapping = {
+            "user": {"a": 3, "b": 4},
+            "item": {"x": 3, "y": 4, "z": 5},
+        }
+        job._embeddings_for_metadata = None
+
+        inputs = job._create_broadcast_inputs([{"user": 3}, {"user": 4}], [[3, 4], [5]])
+
+        self.assertEqual(list(inputs.context_inputs["user"]), [3, 4])
+        self.assertEqual(inputs.arm_indices.tolist(), [[3, 4], [5, 0]])
+        self.assertEqual(list(inputs.counts), [2, 1])
+
+    def test_obs_columns_repeat_each_observation_per_arm(self):
+        job = SupervisedModelTraining(
+            project="tests.factories.config.test_base_training_with_auxiliar_output",
+            recommender_module_class="mars_gym.model.base_model.LogisticRegression",
+            recommender_extra_params={"n_factors": 10},
+        )
+        job._index_mapping = {
+            "user": {"a": 3, "b": 4},
+            "item": {"x": 3, "y": 4, "z": 5},
+        }
+
+        columns = job._create_obs_columns([{"user": 3}, {"user": 4}], [[3, 4], [5]])
+
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(list(columns["user"]), [3, 3, 4])
+        self.assertEqual(list(columns["item"]), [3, 4, 5])
+        self.assertEqual(list(columns[job.project_config.output_column.name]), [1, 1, 1])
+
+
+class TestRefreshHardNegatives(unittest.TestCase):
+    def test_refreshes_before_the_first_epoch_and_every_interval(self):
+        dataset = Mock()
+        callback = RefreshHardNegatives(dataset, Mock(), interval=2, batch_size=10)
+
+        refreshed = []
+        for epoch in range(5):
+            dataset.refresh_hard_negatives.reset_mock()
+            callback.on_start_epoch({torchbearer.EPOCH: epoch})
+            if dataset.refresh_hard_negatives.called:
+                refreshed.append(epoch)
+
+        self.assertEqual(refreshed, [0, 2, 4])
+
+
+class TestSimulatedPolicy(unittest.TestCase):
+    def test_pickles_without_the_refit_in_flight(self):
+        policy = SimulatedPolicy(agent=None, output_path="policies/0_EGreedy")
+        policy.refit_count = 2
+        policy.refit_executor = ThreadPoolExecutor(max_workers=1)
+        policy.pending_refit = (policy.refit_executor.submit(int), 100, None, None)
+
+        restored = pickle.loads(pickle.dumps(policy))
+        policy.refit_executor.shutdown()
+
+        self.assertEqual(restored.refit_count, 2)
+        self.assertEqual(restored.output_path, "policies/0_EGreedy")
+        self.assertIsNone(restored.refit_executor)
+        self.assertIsNone(restored.pending_refit)
+
+
 if __name__ == "__main__":
     unittest.main()
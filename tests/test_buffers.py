@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.simulation.buffers import ColumnarBuffer, PairCounter, ItemCounter
+
+
+class TestColumnarBuffer(unittest.TestCase):
+    def test_append_grows_capacity(self):
+        buffer = ColumnarBuffer(
+            {"user": np.int64, "reward": np.float64, "history": np.object_},
+            initial_capacity=2,
+        )
+        for i in range(5):
+            buffer.append({"user": i, "reward": i / 2, "history": [i, i + 1]})
+
+        self.assertEqual(len(buffer), 5)
+        np.testing.assert_array_equal(buffer.column("user"), np.arange(5))
+
+        df = buffer.to_data_frame()
+        self.assertEqual(list(df.columns), ["user", "reward", "history"])
+        self.assertEqual(df["history"].iloc[3], [3, 4])
+        self.assertEqual(df["reward"].dtype, np.float64)
+
+    def test_data_frame_is_refreshed_after_append(self):
+        buffer = ColumnarBuffer({"user": np.int64})
+        buffer.append({"user": 1})
+        self.assertIs(buffer.to_data_frame(), buffer.to_data_frame())
+
+        buffer.append({"user": 2})
+        self.assertEqual(len(buffer.to_data_frame()), 2)
+
+    def test_keep_compacts_rows(self):
+        buffer = ColumnarBuffer({"user": np.int64}, initial_capacity=2)
+        for i in range(5):
+            buffer.append({"user": i})
+        view = buffer.column("user")
+
+        buffer.keep(np.array([1, 3]))
+        buffer.append({"user": 5})
+
+        np.testing.assert_array_equal(buffer.column("user"), [1, 3, 5])
+        np.testing.assert_array_equal(view, np.arange(5))
+        self.assertEqual(buffer.n_appended, 6)
+
+
+class TestPairCounter(unittest.TestCase):
+    def test_add_and_gather(self):
+        counter = PairCounter(n_items=10, initial_capacity=2)
+        expected = {}
+        rng = np.random.RandomState(0)
+        for _ in range(500):
+            user, item, reward = rng.randint(0, 50), rng.randint(0, 10), rng.randint(0, 2)
+            counter.add(user, item, (1, reward))
+            views, outputs = expected.get((user, item), (0, 0))
+            expected[(user, item)] = (views + 1, outputs + reward)
+
+        self.assertEqual(len(counter), len(expected))
+
+        users = np.array([user for user, _ in expected.keys()] + [99])
+        items = np.array([item for _, item in expected.keys()] + [3])
+        counts = counter.gather(users, items)
+
+        np.testing.assert_array_equal(counts[:-1], np.array(list(expected.values())))
+        np.testing.assert_array_equal(counts[-1], [0, 0])
+
+    def test_gather_on_empty_counter(self):
+        counter = PairCounter(n_items=10)
+        np.testing.assert_array_equal(
+            counter.gather(np.array([1, 2]), np.array([3, 4])), np.zeros((2, 2))
+        )
+
+
+class TestItemCounter(unittest.TestCase):
+    def test_frequency_matches_value_counts(self):
+        items = np.random.RandomState(0).randint(0, 30, size=200)
+        counter = ItemCounter(n_items=5)
+        for item in items:
+            counter.add(item)
+
+        frequencies = pd.Series(items).value_counts(normalize=True)
+        for item in range(40):
+            self.assertEqual(counter.frequency(item), frequencies.get(item, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
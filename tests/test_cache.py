@@ -0,0 +1,62 @@
+import os
+import shutil
+import unittest
+
+import pandas as pd
+
+from mars_gym.data.cache import file_signature, hash_key, read_cached
+
+
+class TestDataFrameCache(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree("tests/output/cache", ignore_errors=True)
+        self.path = "tests/output/cache/data_frame.pkl"
+
+    def tearDown(self):
+        shutil.rmtree("tests/output/cache", ignore_errors=True)
+
+    def test_the_data_frame_is_created_only_once(self):
+        calls = []
+
+        def create_data_frame():
+            calls.append(1)
+            return pd.DataFrame({"item_idx": [3, 4], "hist": [[3], [3, 4]]})
+
+        first = read_cached(self.path, create_data_frame)
+        second = read_cached(self.path, create_data_frame)
+
+        self.assertEqual(len(calls), 1)
+        pd.testing.assert_frame_equal(first, second)
+        self.assertEqual(second["hist"].iloc[1], [3, 4])
+
+    def test_the_least_recently_used_frames_are_evicted(self):
+        frame = pd.DataFrame({"item_idx": range(100)})
+        paths = ["tests/output/cache/{}.pkl".format(i) for i in range(4)]
+
+        for i, path in enumerate(paths[:3]):
+            read_cached(path, lambda: frame)
+            os.utime(path, (i, i))
+        read_cached(paths[0], lambda: frame)  # Used again, so kept
+        size = os.path.getsize(paths[0])
+        read_cached(paths[3], lambda: frame, max_size=2 * size + size // 2)
+
+        self.assertEqual(
+            [os.path.exists(path) for path in paths], [True, False, False, True]
+        )
+
+    def test_key_changes_with_the_file(self):
+        os.makedirs("tests/output/cache", exist_ok=True)
+        csv_path = "tests/output/cache/split.csv"
+        pd.DataFrame({"a": [1]}).to_csv(csv_path, index=False)
+        key = hash_key(file_signature(csv_path), {"a": 1})
+        pd.DataFrame({"a": [1, 2]}).to_csv(csv_path, index=False)
+
+        self.assertNotEqual(key, hash_key(file_signature(csv_path), {"a": 1}))
+        self.assertNotEqual(
+            hash_key(file_signature(csv_path), {"a": 1}),
+            hash_key(file_signature(csv_path), {"a": 2}),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,14 @@ from unittest.mock import patch
 import shutil
 
 from mars_gym.data.utils import DownloadDataset
+import numpy as np
+
+from mars_gym.data.dataset import (
+    InteractionsWithNegativeItemGenerationDataset,
+    InteractionsWithNegativeItemGenerationByAvailableItemsDataset,
+    InteractionsWithWeightedNegativeItemGenerationDataset,
+)
+from mars_gym.meta_config import ProjectConfig, Column, IOType
 
 
 @patch("mars_gym.utils.files.OUTPUT_PATH", "tests/output")
@@ -27,5 +35,105 @@ class TestDataset(unittest.TestCase):
         luigi.build([job], local_scheduler=True)
 
 
+class TestWeightedNegativeItemGeneration(unittest.TestCase):
+    def setUp(self):
+        self.project_config = ProjectConfig(
+            base_dir="",
+            prepare_data_frames_task=None,
+            dataset_class=InteractionsWithWeightedNegativeItemGenerationDataset,
+            user_column=Column("user_idx", IOType.INDEXABLE),
+            item_column=Column("item_idx", IOType.INDEXABLE),
+            other_input_columns=[],
+            output_column=Column("clicked", IOType.NUMBER),
+        )
+        self.data_frame = pd.DataFrame(
+            {
+                "user_idx": [0, 1, 2, 3, 4, 5],
+                "item_idx": [3, 3, 3, 4, 4, 6],
+                "clicked": [1.0] * 6,
+            }
+        )
+
+    def test_negatives_are_seen_items_other_than_the_true_one(self):
+        dataset = InteractionsWithWeightedNegativeItemGenerationDataset(
+            self.data_frame, None, self.project_config, {}, negative_proportion=0.5
+        )
+        (users, items), output = dataset[list(range(6, 12))]
+
+        self.assertTrue(set(items).issubset({3, 4, 6}))
+        self.assertFalse(
+            (items == self.data_frame["item_idx"].values[users]).any()
+        )
+        self.assertTrue((output == 0).all())
+
+    def test_hard_negatives_are_the_top_scored_items(self):
+        dataset = InteractionsWithWeightedNegativeItemGenerationDataset(
+            self.data_frame,
+            None,
+            self.project_config,
+            {},
+            negative_proportion=0.5,
+            hard_negative_proportion=1.0,
+            hard_negatives_top_k=1,
+        )
+        dataset.refresh_hard_negatives(lambda inputs: inputs[1] == 4, batch_size=2)
+        (users, items), _ = dataset[list(range(6, 12))]
+
+        is_item_4 = self.data_frame["item_idx"].values[users] == 4
+        self.assertTrue((items[~is_item_4] == 4).all())
+
+
+class TestNegativeItemMetadata(unittest.TestCase):
+    def setUp(self):
+        self.project_config = ProjectConfig(
+            base_dir="",
+            prepare_data_frames_task=None,
+            dataset_class=InteractionsWithNegativeItemGenerationDataset,
+            user_column=Column("user_idx", IOType.INDEXABLE),
+            item_column=Column("item_idx", IOType.INDEXABLE),
+            other_input_columns=[],
+            output_column=Column("clicked", IOType.NUMBER),
+            metadata_columns=[Column("price", IOType.NUMBER)],
+        )
+        self.data_frame = pd.DataFrame(
+            {
+                "user_idx": [0, 1, 2, 3, 4, 5],
+                "item_idx": [3, 3, 3, 4, 4, 6],
+                "clicked": [1.0] * 6,
+                "available_arms": [[3, 4, 6]] * 6,
+            }
+        )
+        self.embeddings_for_metadata = {"price": np.arange(7) * 10.0}
+        self.index_mapping = {"item_idx": {str(item): item for item in range(7)}}
+
+    def assert_metadata_follows_the_item(self, dataset):
+        (_, items, prices), output = dataset[list(range(6, 12))]
+
+        self.assertTrue((output == 0).all())
+        np.testing.assert_array_equal(prices, items * 10.0)
+
+    def test_random_negatives_carry_their_own_metadata(self):
+        self.assert_metadata_follows_the_item(
+            InteractionsWithNegativeItemGenerationDataset(
+                self.data_frame,
+                self.embeddings_for_metadata,
+                self.project_config,
+                self.index_mapping,
+                negative_proportion=0.5,
+            )
+        )
+
+    def test_available_item_negatives_carry_their_own_metadata(self):
+        self.assert_metadata_follows_the_item(
+            InteractionsWithNegativeItemGenerationByAvailableItemsDataset(
+                self.data_frame,
+                self.embeddings_for_metadata,
+                self.project_config,
+                self.index_mapping,
+                negative_proportion=0.5,
+            )
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+import numpy as np
+
+from mars_gym.utils.index_mapping import (
+    create_index_mapping,
+    create_reverse_index_mapping,
+)
+
+
+class TestReverseIndexMapping(unittest.TestCase):
+    def test_matches_inverted_dict(self):
+        mapping = create_index_mapping(["b", "a", "c", None, "a"])
+        expected = {index: key for key, index in mapping.items()}
+        expected[0] = 0
+
+        reverse = create_reverse_index_mapping(mapping)
+
+        self.assertEqual(len(reverse), len(expected))
+        for index, key in expected.items():
+            self.assertIs(reverse[index], key)
+        self.assertEqual(reverse[np.array([5, 3, 4])].tolist(), ["c", "a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
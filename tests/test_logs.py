@@ -0,0 +1,46 @@
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from mars_gym.simulation.logs import ChunkedLogWriter, read_log
+
+
+class TestChunkedLogWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_csv_appends_chunks(self):
+        path = os.path.join(self.dir, "sim-datalog.csv")
+        pd.DataFrame({"user": [9]}).to_csv(path, index=False)
+
+        writer = ChunkedLogWriter(path, "csv")
+        writer.write(pd.DataFrame({"user": [1, 2], "reward": [0.0, 1.0]}))
+        writer.write(pd.DataFrame({"user": [3], "reward": [1.0]}))
+
+        self.assertEqual(writer.rows, 3)
+        df = read_log(path)
+        self.assertEqual(df["user"].tolist(), [1, 2, 3])
+        self.assertEqual(df["reward"].tolist(), [0.0, 1.0, 1.0])
+
+    def test_rollback_drops_rows_written_after_the_saved_state(self):
+        path = os.path.join(self.dir, "sim-datalog.csv")
+        writer = ChunkedLogWriter(path, "csv")
+        writer.write(pd.DataFrame({"user": [1, 2]}))
+        saved_writer = copy.deepcopy(writer)
+        writer.write(pd.DataFrame({"user": [3]}))
+
+        saved_writer.rollback()
+        saved_writer.write(pd.DataFrame({"user": [4]}))
+
+        self.assertEqual(read_log(path)["user"].tolist(), [1, 2, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.evaluation.predictions import (
+    RaggedArray,
+    convert_csv_test_set_predictions,
+    read_test_set_predictions,
+    write_test_set_predictions,
+)
+
+
+class TestTestSetPredictions(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame(
+            {
+                "user": [1, 2, 3],
+                "item": ["a", "b", "c"],
+                "sorted_actions": [["a", "b"], [], ["c", "a", "b"]],
+                "prob_actions": [[1.0, 0.0], [], [0.5, 0.3, 0.2]],
+                "action_scores": [[0.9, 0.1], [], [0.7, 0.2, 0.1]],
+            }
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def assert_same_predictions(self, df: pd.DataFrame):
+        self.assertEqual(list(df["item"]), ["a", "b", "c"])
+        for column in ["sorted_actions", "prob_actions", "action_scores"]:
+            self.assertEqual(
+                [list(row) for row in df[column]], list(self.df[column]), column
+            )
+
+    def test_round_trip(self):
+        path = os.path.join(self.dir, "test_set_predictions")
+        write_test_set_predictions(self.df, path)
+
+        df = read_test_set_predictions(path, dtype={"item": "str"})
+        self.assert_same_predictions(df)
+        self.assertIsInstance(df["prob_actions"].iloc[2], np.ndarray)
+
+    def test_convert_csv(self):
+        csv_path = os.path.join(self.dir, "test_set_predictions.csv")
+        self.df.to_csv(csv_path, index=False)
+        path = os.path.join(self.dir, "test_set_predictions")
+        convert_csv_test_set_predictions(csv_path, path)
+
+        self.assert_same_predictions(read_test_set_predictions(path))
+
+    def test_ragged_rows_are_views(self):
+        ragged = RaggedArray.from_lists([[1, 2], [3]], dtype=np.int64)
+        np.testing.assert_array_equal(ragged.offsets, [0, 2, 3])
+        self.assertIs(ragged[1].base, ragged.values)
+
+
+if __name__ == "__main__":
+    unittest.main()
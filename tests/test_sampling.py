@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from mars_gym.utils.sampling import AliasTable, ArmSampler
+
+
+class TestArmSampler(unittest.TestCase):
+    def test_rows_are_distinct_sorted_and_exclude_the_true_item(self):
+        sampler = ArmSampler(np.arange(3, 23), seed=42)
+        exclude = np.arange(3, 13)
+        samples = sampler.sample(len(exclude), 5, exclude=exclude)
+
+        self.assertEqual(samples.shape, (10, 5))
+        self.assertTrue((np.diff(samples, axis=1) > 0).all())
+        self.assertFalse((samples == exclude[:, None]).any())
+
+    def test_same_seed_same_samples(self):
+        first = ArmSampler(np.arange(100), seed=7).sample(4, 10)
+        second = ArmSampler(np.arange(100), seed=7).sample(4, 10)
+        np.testing.assert_array_equal(first, second)
+
+    def test_small_catalog_returns_every_item(self):
+        samples = ArmSampler(np.arange(5), seed=42).sample(2, 100)
+        np.testing.assert_array_equal(samples, [np.arange(5)] * 2)
+
+    def test_popularity_never_draws_items_without_weight(self):
+        sampler = ArmSampler(np.arange(4), weights=np.array([0, 1, 0, 3]), seed=42)
+        np.testing.assert_array_equal(sampler.sample(3, 2), [[1, 3]] * 3)
+
+
+class TestAliasTable(unittest.TestCase):
+    def test_draws_follow_the_weights(self):
+        weights = np.array([1.0, 2.0, 3.0, 4.0])
+        draws = AliasTable(weights).sample(np.random.default_rng(42), 100000)
+        np.testing.assert_allclose(
+            np.bincount(draws) / len(draws), weights / weights.sum(), atol=0.01
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.data.dataset import InteractionsDataset
+from mars_gym.data.storage import (
+    ArrayColumns,
+    MemoryMappedColumns,
+    write_memory_mapped_columns,
+)
+from mars_gym.meta_config import Column, IOType, ProjectConfig
+
+
+class TestMemoryMappedColumns(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame(
+            {
+                "user": np.arange(10),
+                "reward": np.arange(10) / 2,
+                "history": [list(range(i % 4)) for i in range(10)],
+            }
+        )
+        self.columns = write_memory_mapped_columns(
+            [self.df.iloc[:4], self.df.iloc[4:]],
+            {
+                "user": IOType.INDEXABLE,
+                "reward": IOType.NUMBER,
+                "history": IOType.INT_ARRAY,
+            },
+            self.dir + "/train",
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_gathers_rows_across_chunks(self):
+        indices = [7, 2, 2, 9, 0]
+        self.assertEqual(len(self.columns), 10)
+        np.testing.assert_array_equal(self.columns["user"][indices], indices)
+        np.testing.assert_array_equal(
+            self.columns["reward"][indices], np.array(indices) / 2
+        )
+
+    def test_array_columns_are_padded_to_the_widest_row(self):
+        np.testing.assert_array_equal(
+            self.columns["history"][[3, 1, 0]], [[0, 1, 2], [0, 0, 0], [0, 0, 0]]
+        )
+        np.testing.assert_array_equal(self.columns["history"][3], [0, 1, 2])
+
+    def test_pickles_without_the_data(self):
+        columns = pickle.loads(pickle.dumps(MemoryMappedColumns(self.dir + "/train")))
+        np.testing.assert_array_equal(columns["history"][[2]], [[0, 1, 0]])
+
+
+class TestArrayColumns(unittest.TestCase):
+    def test_reads_like_the_data_frame(self):
+        columns = {
+            "user": np.array([3, 3, 4]),
+            "item": np.array([5, 6, 5]),
+            "history": np.array([[1], [1, 2], []], dtype=object),
+            "buy": np.ones(3, dtype=np.int64),
+        }
+        project_config = ProjectConfig(
+            base_dir="",
+            prepare_data_frames_task=None,
+            dataset_class=InteractionsDataset,
+            user_column=Column("user", IOType.INDEXABLE),
+            item_column=Column("item", IOType.INDEXABLE),
+            other_input_columns=[Column("history", IOType.INT_ARRAY)],
+            output_column=Column("buy", IOType.NUMBER),
+        )
+
+        from_arrays = InteractionsDataset(
+            ArrayColumns(columns, 3), None, project_config, {}
+        )
+        from_data_frame = InteractionsDataset(
+            ArrayColumns(columns, 3).to_data_frame(), None, project_config, {}
+        )
+
+        self.assertEqual(len(from_arrays), 3)
+        for expected, actual in zip(from_data_frame[[2, 0]][0], from_arrays[[2, 0]][0]):
+            np.testing.assert_array_equal(actual, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()